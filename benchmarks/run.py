@@ -0,0 +1,193 @@
+"""Benchmark the migration, webhook and calendar read paths
+
+Seeds N SubscriptionCalendar rows (each with a few CalendarItems) inside a
+transaction that is rolled back afterwards, runs migrate_subscription_data
+against the local Seal stand-in, then replays webhook_handler and
+calendar_view requests, reporting throughput and p50/p99 latency for each.
+
+Requires a configured Django project:
+
+    DJANGO_SETTINGS_MODULE=myproject.settings python -m benchmarks.run --calendars 5000
+"""
+from typing import Callable, Dict, List
+from unittest.mock import patch
+import argparse
+import json
+import random
+import statistics
+import time
+
+import django
+
+class _Rollback(Exception):
+    pass
+
+def summarize(name: str, latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """Throughput and latency percentiles (in milliseconds) for one scenario"""
+    if not latencies:
+        raise RuntimeError(f"{name} recorded no operations; check the seeded data and the scenario's setup")
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'scenario': name,
+        'operations': len(latencies),
+        'ops_per_second': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': percentiles[49] * 1000,
+        'p99_ms': percentiles[98] * 1000,
+    }
+
+def timed_calls(calls: List[Callable[[], object]]) -> List[float]:
+    latencies = []
+    for call in calls:
+        started = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+def seed(calendars: int, items_per_calendar: int) -> List[str]:
+    """Create calendars and their items, returning the customer IDs
+
+    Each calendar gets one processed delivery a month ago followed by
+    ``items_per_calendar`` scheduled ones, which is what the migration
+    export reads its last billing date and product lines from.
+
+    Assumes the project's Customer model can be created from a primary key
+    alone; adjust here if it has other required fields.
+    """
+    from datetime import timedelta
+    from django.utils import timezone
+    from calendar.models import SubscriptionCalendar, CalendarItem
+
+    Customer = SubscriptionCalendar._meta.get_field('customer').related_model
+    customers = Customer.objects.bulk_create([Customer() for _ in range(calendars)])
+    customer_ids = [customer.pk for customer in customers]
+
+    created = SubscriptionCalendar.objects.bulk_create([
+        SubscriptionCalendar(customer_id=customer_id, seal_subscription_id=f"seal_sub_{index + 1}")
+        for index, customer_id in enumerate(customer_ids)
+    ])
+
+    start_date = timezone.now().date()
+    CalendarItem.objects.bulk_create([
+        CalendarItem(
+            calendar=calendar,
+            delivery_date=start_date + timedelta(days=30 * step),
+            product_variant_id=f"variant_{step % 3}",
+            quantity=1,
+            status='scheduled' if step >= 0 else 'processed'
+        )
+        for calendar in created
+        for step in range(-1, items_per_calendar)
+    ], batch_size=2000)
+    return customer_ids
+
+def bench_migration(stub, concurrency: int, requests_per_second: float) -> Dict[str, float]:
+    import migration_plan
+    from services.seal_integration import SealSubscriptionService
+
+    latencies: List[float] = []
+
+    class TimedSealService(SealSubscriptionService):
+        def create_subscription(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return super().create_subscription(*args, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with patch.object(migration_plan, 'SealSubscriptionService', TimedSealService):
+        migration_plan.migrate_subscription_data(
+            'bench_api_key',
+            'bench.myshopify.com',
+            concurrency=concurrency,
+            requests_per_second=requests_per_second,
+            resume=False,
+            service_options={'base_url': stub.base_url}
+        )
+    return summarize('migrate_subscription_data', latencies, time.perf_counter() - started)
+
+def bench_webhooks(requests: int, calendars: int) -> Dict[str, float]:
+    from django.test import RequestFactory
+    from calendar.views import webhook_handler
+
+    factory = RequestFactory()
+    payloads = [
+        {
+            'event_type': 'subscription.updated',
+            'subscription_id': f"seal_sub_{random.randint(1, calendars)}",
+            'product_changes': [{'variant_id': f"variant_{random.randint(0, 2)}", 'quantity': 2}]
+        }
+        for _ in range(requests)
+    ]
+    calls = [
+        lambda payload=payload: webhook_handler(factory.post(
+            '/webhooks/seal/', data=json.dumps(payload), content_type='application/json'
+        ))
+        for payload in payloads
+    ]
+
+    started = time.perf_counter()
+    latencies = timed_calls(calls)
+    return summarize('webhook_handler', latencies, time.perf_counter() - started)
+
+def bench_calendar_view(requests: int, customer_ids: List[str]) -> Dict[str, float]:
+    from django.core.cache import cache
+    from django.test import RequestFactory
+    from calendar.views import calendar_view
+
+    cache.clear()
+    factory = RequestFactory()
+    calls = [
+        lambda customer_id=random.choice(customer_ids): calendar_view(
+            factory.get('/calendar/'), customer_id
+        )
+        for _ in range(requests)
+    ]
+
+    started = time.perf_counter()
+    latencies = timed_calls(calls)
+    return summarize('calendar_view', latencies, time.perf_counter() - started)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calendars', type=int, default=1000)
+    parser.add_argument('--items-per-calendar', type=int, default=6)
+    parser.add_argument('--requests', type=int, default=1000, help='webhook and calendar view requests')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate-limit', type=float, default=40.0, help='client-side Seal requests per second')
+    parser.add_argument('--stub-latency', type=float, default=0.05)
+    parser.add_argument('--stub-error-rate', type=float, default=0.01)
+    parser.add_argument('--stub-rate-limit', type=float, default=None, help='stub 429 threshold per second')
+    args = parser.parse_args()
+
+    django.setup()
+    from django.db import transaction
+    from benchmarks.seal_stub import SealStubServer
+
+    results = []
+    try:
+        with transaction.atomic():
+            customer_ids = seed(args.calendars, args.items_per_calendar)
+            with SealStubServer(
+                latency=args.stub_latency,
+                error_rate=args.stub_error_rate,
+                rate_limit=args.stub_rate_limit
+            ) as stub:
+                results.append(bench_migration(stub, args.concurrency, args.rate_limit))
+                stub_stats = dict(stub.stats)
+            results.append(bench_webhooks(args.requests, args.calendars))
+            results.append(bench_calendar_view(args.requests, customer_ids))
+            raise _Rollback()
+    except _Rollback:
+        pass
+
+    print(f"{'scenario':<28}{'ops':>8}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for result in results:
+        print(
+            f"{result['scenario']:<28}{result['operations']:>8}"
+            f"{result['ops_per_second']:>12.1f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+        )
+    print(f"Seal stub: {stub_stats}")
+
+if __name__ == '__main__':
+    main()
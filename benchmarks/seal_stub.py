@@ -0,0 +1,169 @@
+"""Local stand-in for the Seal subscription endpoints used by SealSubscriptionService
+
+Serves POST /subscriptions, GET /subscriptions/<id> and PATCH
+/subscriptions/<id> under /apps/seal/api/v1 with configurable latency,
+error rate and rate limit, so the migration and sync paths can be exercised
+against realistic API behaviour without touching a real shop.
+
+    with SealStubServer(latency=0.05, error_rate=0.01, rate_limit=40) as stub:
+        migrate_subscription_data('key', 'shop', service_options={'base_url': stub.base_url})
+"""
+from typing import Any, Dict, Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from services.seal_integration import TokenBucket
+import hashlib
+import itertools
+import json
+import random
+import threading
+import time
+
+API_ROOT = '/apps/seal/api/v1'
+
+class SealStubServer:
+    """In-process HTTP server emulating Seal's subscription API"""
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        latency_jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit: Optional[float] = None,
+        host: str = '127.0.0.1',
+        port: int = 0
+    ):
+        self.latency = latency  # seconds added to every response
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate  # share of requests answered with a 503
+        self.rate_limit = rate_limit  # requests per second before 429s
+        self.subscriptions: Dict[str, Dict[str, Any]] = {}
+        self.idempotency_keys: Dict[str, str] = {}
+        self.stats = {'requests': 0, 'throttled': 0, 'errors': 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{API_ROOT}"
+
+    def start(self) -> 'SealStubServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'SealStubServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    def _handler_class(self):
+        stub = self
+        limiter = _Throttle(self.rate_limit) if self.rate_limit else None
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_PATCH(self):
+                self._handle('PATCH')
+
+            def _handle(self, method: str) -> None:
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+
+                with stub._lock:
+                    stub.stats['requests'] += 1
+
+                delay = stub.latency + random.uniform(0, stub.latency_jitter)
+                if delay:
+                    time.sleep(delay)
+
+                if limiter is not None and not limiter.try_acquire():
+                    with stub._lock:
+                        stub.stats['throttled'] += 1
+                    return self._respond(429, {'error': 'Too many requests'}, {'Retry-After': '1'})
+
+                if random.random() < stub.error_rate:
+                    with stub._lock:
+                        stub.stats['errors'] += 1
+                    return self._respond(503, {'error': 'Service unavailable'})
+
+                path = self.path.split('?')[0]
+                if not path.startswith(f"{API_ROOT}/subscriptions"):
+                    return self._respond(404, {'error': 'Not found'})
+                subscription_id = path[len(f"{API_ROOT}/subscriptions"):].strip('/')
+
+                if method == 'POST' and not subscription_id:
+                    return self._create(body or {})
+                if method in ('GET', 'PATCH') and subscription_id:
+                    return self._existing(method, subscription_id, body or {})
+                return self._respond(405, {'error': 'Method not allowed'})
+
+            def _create(self, data: Dict[str, Any]) -> None:
+                key = self.headers.get('Idempotency-Key')
+                with stub._lock:
+                    if key and key in stub.idempotency_keys:
+                        subscription = stub.subscriptions[stub.idempotency_keys[key]]
+                        return self._respond(200, subscription)
+
+                    subscription = dict(data, id=f"seal_sub_{next(stub._ids)}", status='active')
+                    stub.subscriptions[subscription['id']] = subscription
+                    if key:
+                        stub.idempotency_keys[key] = subscription['id']
+                self._respond(201, subscription)
+
+            def _existing(self, method: str, subscription_id: str, data: Dict[str, Any]) -> None:
+                with stub._lock:
+                    subscription = stub.subscriptions.get(subscription_id)
+                    if subscription is None:
+                        return self._respond(404, {'error': 'Subscription not found'})
+                    if method == 'PATCH':
+                        subscription.update(data)
+                    subscription = dict(subscription)
+
+                etag = '"' + hashlib.md5(json.dumps(subscription, sort_keys=True).encode()).hexdigest() + '"'
+                if method == 'GET' and self.headers.get('If-None-Match') == etag:
+                    return self._respond(304, None, {'ETag': etag})
+                self._respond(200, subscription, {'ETag': etag})
+
+            def _respond(self, status: int, data: Any, headers: Optional[Dict[str, str]] = None) -> None:
+                payload = json.dumps(data).encode() if data is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+class _Throttle(TokenBucket):
+    """Non-blocking variant of the client's token bucket for server-side limits"""
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
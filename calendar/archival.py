@@ -0,0 +1,131 @@
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from services import metrics
+from .models import CalendarItem, ArchivedCalendarItem
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+ARCHIVABLE_STATUSES = ('processed', 'skipped', 'cancelled')
+DEFAULT_ARCHIVE_AFTER_DAYS = 180
+_ITEM_FIELDS = ('id', 'calendar_id', 'delivery_date', 'product_variant_id', 'quantity', 'status')
+
+def archive_calendar_items(
+    cutoff_days: Optional[int] = None,
+    batch_size: int = 1000,
+    pause: float = 0.5,
+    max_batches: Optional[int] = None
+) -> int:
+    """Move settled items older than the cutoff into ArchivedCalendarItem
+
+    Items that are processed, skipped or cancelled and were due more than
+    ``cutoff_days`` (default settings.CALENDAR_ARCHIVE_AFTER_DAYS) ago are
+    copied and deleted ``batch_size`` at a time, one transaction per batch,
+    sleeping ``pause`` seconds between batches so the job never holds locks
+    or saturates the database for long. Rows locked by another transaction
+    or with a Seal sync still in flight are left for the next run.
+    """
+    cutoff_days = cutoff_days if cutoff_days is not None else getattr(
+        settings, 'CALENDAR_ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS
+    )
+    cutoff = timezone.now().date() - timedelta(days=cutoff_days)
+
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = _archive_batch(cutoff, batch_size)
+        archived += moved
+        batches += 1
+        if moved < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    logger.info(f"Archived {archived} calendar items due before {cutoff} in {batches} batches")
+    return archived
+
+def _archive_batch(cutoff: date, batch_size: int) -> int:
+    with transaction.atomic():
+        rows = list(
+            CalendarItem.objects.filter(
+                status__in=ARCHIVABLE_STATUSES,
+                delivery_date__lt=cutoff
+            ).exclude(
+                seal_sync_entries__status__in=['pending', 'processing']
+            ).order_by('pk').select_for_update(skip_locked=True).values_list(*_ITEM_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        ArchivedCalendarItem.objects.bulk_create(
+            [
+                ArchivedCalendarItem(
+                    original_id=item_id,
+                    calendar_id=calendar_id,
+                    delivery_date=delivery_date,
+                    product_variant_id=variant_id,
+                    quantity=quantity,
+                    status=status
+                )
+                for item_id, calendar_id, delivery_date, variant_id, quantity, status in rows
+            ],
+            ignore_conflicts=True
+        )
+        CalendarItem.objects.filter(pk__in=[row[0] for row in rows]).delete()
+
+    metrics.increment('calendar_items_archived_total', len(rows))
+    return len(rows)
+
+def calendar_history(
+    customer_id: str,
+    before: Optional[Tuple[date, int]] = None,
+    limit: int = 20,
+    include_archived: bool = False
+) -> List[Dict[str, Any]]:
+    """A customer's settled deliveries, newest first
+
+    ``before`` is a (delivery_date, id) position to page back from. Reads
+    the hot table and, with ``include_archived``, the archive too; archived
+    rows keep their original IDs, so one cursor orders both. Each side
+    returns at most ``limit`` rows and the two are merged.
+    """
+    items = CalendarItem.objects.filter(
+        calendar__customer_id=customer_id
+    ).exclude(status='scheduled')
+    if before is not None:
+        items = items.filter(
+            Q(delivery_date__lt=before[0]) | Q(delivery_date=before[0], id__lt=before[1])
+        )
+    history = [
+        dict(row, archived=False)
+        for row in items.order_by('-delivery_date', '-id').values(
+            'id', 'delivery_date', 'product_variant_id', 'quantity', 'status'
+        )[:limit]
+    ]
+
+    if include_archived:
+        archived = ArchivedCalendarItem.objects.filter(calendar__customer_id=customer_id)
+        if before is not None:
+            archived = archived.filter(
+                Q(delivery_date__lt=before[0]) | Q(delivery_date=before[0], original_id__lt=before[1])
+            )
+        history += [
+            {
+                'id': row['original_id'],
+                'delivery_date': row['delivery_date'],
+                'product_variant_id': row['product_variant_id'],
+                'quantity': row['quantity'],
+                'status': row['status'],
+                'archived': True,
+            }
+            for row in archived.order_by('-delivery_date', '-original_id').values(
+                'original_id', 'delivery_date', 'product_variant_id', 'quantity', 'status'
+            )[:limit]
+        ]
+        history.sort(key=lambda row: (row['delivery_date'], row['id']), reverse=True)
+
+    return history[:limit]
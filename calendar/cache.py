@@ -0,0 +1,70 @@
+from typing import Any, Callable, Dict
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+import json
+import threading
+import time
+
+DEFAULT_CALENDAR_CACHE_TTL = 60 * 60 * 6  # 6 hours; writes invalidate entries
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+def _version_key(customer_id: str) -> str:
+    return f"calendar:version:{customer_id}"
+
+def get_calendar_version(customer_id: str) -> int:
+    """Current cache version for a customer's calendar"""
+    version = cache.get(_version_key(customer_id))
+    if version is None:
+        # Seed from the clock so an evicted version never reuses an old key
+        cache.add(_version_key(customer_id), int(time.time() * 1000), timeout=None)
+        version = cache.get(_version_key(customer_id))
+    return version
+
+def bump_calendar_version(customer_id: str) -> None:
+    """Invalidate every cached view of a customer's calendar"""
+    try:
+        cache.incr(_version_key(customer_id))
+    except ValueError:
+        # No version yet, so nothing cached under one either
+        get_calendar_version(customer_id)
+
+def invalidate_calendar_cache(customer_id: str) -> None:
+    """Bump the customer's version once the current transaction commits"""
+    transaction.on_commit(lambda: bump_calendar_version(customer_id))
+
+def get_cached_calendar(customer_id: str, variant: str, build: Callable[[], Dict[str, Any]]) -> str:
+    """Return the serialized calendar payload, building it on a miss
+
+    Entries are keyed by the customer's current version, so a bump makes
+    all of them unreachable without having to find and delete them.
+    """
+    key = f"calendar:{customer_id}:v{get_calendar_version(customer_id)}:{variant}"
+    body = cache.get(key)
+    if body is not None:
+        _record('hits')
+        return body
+
+    _record('misses')
+    body = json.dumps(build(), cls=DjangoJSONEncoder)
+    ttl = getattr(settings, 'CALENDAR_CACHE_TTL', DEFAULT_CALENDAR_CACHE_TTL)
+    cache.set(key, body, timeout=ttl)
+    return body
+
+def calendar_cache_stats() -> Dict[str, Any]:
+    """Hit and miss counters for this process"""
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+def _record(outcome: str) -> None:
+    with _stats_lock:
+        _stats[outcome] += 1
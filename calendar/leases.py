@@ -0,0 +1,106 @@
+"""Lease-based claiming and retry scheduling for the database-backed queues
+
+WebhookEvent and SealSyncOutbox rows share one life cycle: ``pending`` rows
+are claimed into ``processing`` under a lease, then either finish, go back
+to ``pending`` after an exponential backoff, or end in a terminal failure
+status once they have failed ``MAX_ATTEMPTS`` times.
+"""
+from typing import List, Tuple, Type
+from collections import Counter
+from datetime import timedelta
+from django.db import models, transaction
+from django.utils import timezone
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 30  # seconds, doubled after each failed attempt
+CLAIM_LEASE = 300  # seconds before an unfinished claim is handed out again
+
+def claim_due(
+    model: Type[models.Model],
+    key_field: str,
+    order_by: Tuple[str, ...],
+    batch_size: int,
+    lease: int = CLAIM_LEASE
+) -> List[models.Model]:
+    """Claim the next batch of due rows, a whole key at a time
+
+    Claimed rows are moved to ``processing`` with a lease, so rows left
+    behind by a crashed worker become available again once it expires.
+    Rows sharing a ``key_field`` value must be handled in order by one
+    worker, so a key is only claimed with all of its due rows, and only
+    while none of its rows is waiting out a retry backoff, leased to
+    another worker, or locked by a concurrent claim. Rows with an empty
+    key are claimed on their own.
+    """
+    now = timezone.now()
+    blocked = model.objects.filter(
+        status__in=['pending', 'processing'],
+        available_at__gt=now
+    ).exclude(**{key_field: ''}).values(key_field)
+    ready = model.objects.filter(
+        status__in=['pending', 'processing'],
+        available_at__lte=now
+    ).exclude(**{f'{key_field}__in': blocked})
+    due = ready.select_for_update(skip_locked=True)
+
+    with transaction.atomic():
+        rows = list(due.order_by(*order_by)[:batch_size])
+        keys = {getattr(row, key_field) for row in rows} - {''}
+        if keys:
+            rows += list(
+                due.filter(
+                    **{f'{key_field}__in': keys}
+                ).exclude(
+                    id__in=[row.id for row in rows]
+                )
+            )
+
+            # Rows we could not lock belong to a concurrent claim; leave the key to it
+            totals = dict(
+                ready.filter(
+                    **{f'{key_field}__in': keys}
+                ).values_list(key_field).annotate(count=models.Count('id'))
+            )
+            claimed = Counter(getattr(row, key_field) for row in rows)
+            contested = {
+                key for key in keys
+                if claimed[key] < totals.get(key, 0)
+            }
+            rows = [row for row in rows if getattr(row, key_field) not in contested]
+
+        model.objects.filter(
+            id__in=[row.id for row in rows]
+        ).update(
+            status='processing',
+            available_at=now + timedelta(seconds=lease)
+        )
+    return rows
+
+def schedule_retry(
+    rows: models.QuerySet,
+    attempts: int,
+    error: str,
+    max_attempts: int = MAX_ATTEMPTS,
+    failed_status: str = 'failed'
+) -> str:
+    """Put failed rows back to ``pending`` with backoff, or give up on them
+
+    Returns ``'retried'``, or ``failed_status`` once ``attempts`` reaches
+    ``max_attempts``.
+    """
+    if attempts >= max_attempts:
+        rows.update(
+            status=failed_status,
+            attempts=attempts,
+            last_error=error,
+            available_at=timezone.now()
+        )
+        return failed_status
+
+    rows.update(
+        status='pending',
+        attempts=attempts,
+        last_error=error,
+        available_at=timezone.now() + timedelta(seconds=RETRY_DELAY * (2 ** (attempts - 1)))
+    )
+    return 'retried'
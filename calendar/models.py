@@ -1,9 +1,15 @@
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 class SubscriptionCalendar(models.Model):
     customer = models.ForeignKey('Customer', on_delete=models.CASCADE)
     seal_subscription_id = models.CharField(max_length=255)
+    delivery_interval_months = models.PositiveSmallIntegerField(default=1)
+    # Day of month deliveries fall on; shorter months clamp to their last day
+    delivery_anchor_day = models.PositiveSmallIntegerField(null=True, blank=True)
+    # Cleared when the subscription is cancelled in Seal; no new deliveries are scheduled
+    is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -45,5 +51,135 @@ class CalendarItem(models.Model):
         indexes = [
             models.Index(fields=['delivery_date']),
             models.Index(fields=['status']),
+            # Serves keyset pagination over a calendar's scheduled items
+            models.Index(fields=['calendar', 'status', 'delivery_date', 'id']),
+        ]
+        ordering = ['delivery_date']
+
+class MigrationJournal(models.Model):
+    """Per-customer progress record for the Seal migration"""
+    customer = models.OneToOneField(
+        'Customer',
+        related_name='migration_journal',
+        on_delete=models.CASCADE
+    )
+    state = models.CharField(
+        max_length=20,
+        choices=[
+            ('pending', 'Pending'),
+            ('created', 'Created'),
+            ('failed', 'Failed')
+        ],
+        default='pending'
+    )
+    seal_subscription_id = models.CharField(max_length=255, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['state']),
+        ]
+
+
+class WebhookEvent(models.Model):
+    """Raw Seal webhook awaiting processing by the webhook worker pool"""
+    # Seal's event ID; unique so redelivered webhooks are dropped on ingest
+    event_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    event_type = models.CharField(max_length=100)
+    subscription_id = models.CharField(max_length=255, blank=True)
+    payload = models.JSONField()
+    occurred_at = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('pending', 'Pending'),
+            ('processing', 'Processing'),
+            ('processed', 'Processed'),
+            ('dead', 'Dead')
+        ],
+        default='pending'
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Earliest time the event may be (re)claimed: retry backoff or claim lease
+    available_at = models.DateTimeField(default=timezone.now)
+    received_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['subscription_id', 'status']),
+        ]
+
+
+class SealSyncOutbox(models.Model):
+    """Calendar item change waiting to be pushed to Seal by the dispatcher"""
+    calendar_item = models.ForeignKey(
+        CalendarItem,
+        related_name='seal_sync_entries',
+        on_delete=models.CASCADE
+    )
+    seal_subscription_id = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('pending', 'Pending'),
+            ('processing', 'Processing'),
+            ('sent', 'Sent'),
+            ('failed', 'Failed')
+        ],
+        default='pending'
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['seal_subscription_id', 'status']),
+        ]
+
+
+class CalendarSummary(models.Model):
+    """Denormalized per-customer view of upcoming deliveries
+    
+    Refreshed in the same transaction as every write to the customer's
+    calendar items, so the storefront can read it by primary key instead of
+    joining and sorting items on each page load.
+    """
+    customer = models.OneToOneField(
+        'Customer',
+        primary_key=True,
+        related_name='calendar_summary',
+        on_delete=models.CASCADE
+    )
+    next_delivery_date = models.DateField(null=True, blank=True)
+    scheduled_count = models.PositiveIntegerField(default=0)
+    # [{"date": "YYYY-MM-DD", "items": [[item_id, variant_id, quantity], ...]}, ...]
+    upcoming_deliveries = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class ArchivedCalendarItem(models.Model):
+    """Settled calendar item moved out of the hot CalendarItem table"""
+    # Primary key the row had in CalendarItem; unique so a rerun can't copy it twice
+    original_id = models.BigIntegerField(unique=True)
+    calendar = models.ForeignKey(
+        SubscriptionCalendar,
+        related_name='archived_items',
+        on_delete=models.CASCADE
+    )
+    delivery_date = models.DateField()
+    product_variant_id = models.CharField(max_length=255)
+    quantity = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=20)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['calendar', 'delivery_date']),
         ]
-        ordering = ['delivery_date']
\ No newline at end of file
@@ -0,0 +1,195 @@
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from datetime import date
+from itertools import islice
+from django.db import models, transaction
+from django.utils import timezone
+from .models import SubscriptionCalendar, CalendarItem, ArchivedCalendarItem
+from .cache import invalidate_calendar_cache
+from .summary import refresh_customer_summaries
+import logging
+
+logger = logging.getLogger(__name__)
+
+_DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+def days_in_month(year: int, month: int) -> int:
+    """Number of days in a month, accounting for leap years"""
+    if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+        return 29
+    return _DAYS_IN_MONTH[month - 1]
+
+def month_index(value: date) -> int:
+    """Months since year 0, so month arithmetic becomes integer addition"""
+    return value.year * 12 + value.month - 1
+
+def date_from_month_index(index: int, day: int) -> date:
+    """Build a date in the given month, clamping ``day`` to the month's end"""
+    year, month = divmod(index, 12)
+    return date(year, month + 1, min(day, days_in_month(year, month + 1)))
+
+def add_months(start: date, months: int, anchor_day: Optional[int] = None) -> date:
+    """Step a date by whole calendar months
+
+    The day is clamped to the end of shorter months (Jan 31 + 1 month is
+    Feb 28/29). Pass ``anchor_day`` to step from a date that was itself
+    clamped without drifting (Feb 28 + 1 month is Mar 31 when anchored on 31).
+    """
+    return date_from_month_index(month_index(start) + months, anchor_day or start.day)
+
+def project_delivery_dates(
+    last_dates: Sequence[date],
+    anchor_days: Sequence[int],
+    intervals: Sequence[int],
+    counts: Sequence[int],
+    today: date
+) -> List[List[date]]:
+    """Compute upcoming delivery dates for a batch of subscriptions
+
+    Works column-wise over the batch: the ith subscription gets
+    ``counts[i]`` dates, stepping ``intervals[i]`` months at a time from
+    ``last_dates[i]`` on ``anchor_days[i]``, starting with the first step
+    that lands on or after ``today``.
+    """
+    last_months = [month_index(last_date) for last_date in last_dates]
+    today_month = month_index(today)
+
+    schedules = []
+    for last_month, anchor_day, interval, count in zip(last_months, anchor_days, intervals, counts):
+        # Skip whole steps that would land in the past for lapsed calendars
+        first_step = max(1, -(-(today_month - last_month) // interval))
+        months = [last_month + step * interval for step in range(first_step, first_step + count + 1)]
+        dates = [date_from_month_index(month, anchor_day) for month in months]
+        schedules.append([value for value in dates if value >= today][:count])
+    return schedules
+
+def materialize_delivery_horizon(
+    horizon: int = 12,
+    batch_size: int = 1000,
+    today: Optional[date] = None
+) -> int:
+    """Extend every active calendar to ``horizon`` upcoming deliveries
+
+    Calendars are processed in batches: a batch costs two queries to read
+    its schedule state, one pass of date arithmetic and one ``bulk_create``.
+    Each new delivery repeats the product lines of the calendar's latest
+    delivery. Calendars cancelled in Seal (``is_active`` cleared) are left
+    alone, however long ago their last delivery was.
+    Dates fall on the calendar's ``delivery_anchor_day``; calendars without
+    one are anchored on the day of their first delivery, archived ones
+    included, and the anchor is stored so later archival or date moves
+    can't shift it.
+    """
+    today = today or timezone.now().date()
+    calendars = SubscriptionCalendar.objects.filter(is_active=True).order_by('pk').values_list(
+        'pk', 'customer_id', 'delivery_interval_months', 'delivery_anchor_day'
+    ).iterator(chunk_size=batch_size)
+
+    created = 0
+    for batch in _batches(calendars, batch_size):
+        created += _materialize_batch(batch, horizon, today)
+
+    logger.info(f"Materialized {created} calendar items for a {horizon}-delivery horizon")
+    return created
+
+def _batches(rows: Iterator, size: int) -> Iterator[List]:
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+def _first_delivery_days(calendar_ids: List[int], first_dates: Dict[int, date]) -> Dict[int, int]:
+    """Day of each calendar's first delivery, counting archived items"""
+    if not calendar_ids:
+        return {}
+    firsts = {calendar_id: first_dates[calendar_id] for calendar_id in calendar_ids}
+    for calendar_id, first in ArchivedCalendarItem.objects.filter(
+        calendar_id__in=calendar_ids
+    ).values('calendar_id').annotate(first=models.Min('delivery_date')).values_list('calendar_id', 'first'):
+        firsts[calendar_id] = min(firsts[calendar_id], first)
+    return {calendar_id: first.day for calendar_id, first in firsts.items()}
+
+def _materialize_batch(batch: List[Tuple[int, str, int, Optional[int]]], horizon: int, today: date) -> int:
+    """Materialize deliveries for one batch of (pk, customer_id, interval, anchor_day) rows"""
+    calendar_ids = [calendar_id for calendar_id, _, _, _ in batch]
+
+    state = {
+        row['calendar_id']: row
+        for row in CalendarItem.objects.filter(
+            calendar_id__in=calendar_ids
+        ).values('calendar_id').annotate(
+            first=models.Min('delivery_date'),
+            last=models.Max('delivery_date'),
+            upcoming=models.Count(
+                'delivery_date',
+                distinct=True,
+                filter=models.Q(delivery_date__gte=today)
+            )
+        )
+    }
+
+    # Product lines of each calendar's latest delivery serve as the template
+    templates: Dict[int, List[Dict]] = {}
+    latest_delivery = CalendarItem.objects.filter(
+        calendar_id=models.OuterRef('calendar_id')
+    ).order_by('-delivery_date').values('delivery_date')[:1]
+    for line in CalendarItem.objects.filter(
+        calendar_id__in=calendar_ids,
+        delivery_date=models.Subquery(latest_delivery)
+    ).values('calendar_id', 'product_variant_id', 'quantity', 'status'):
+        templates.setdefault(line['calendar_id'], []).append(line)
+
+    due = []
+    for calendar_id, customer_id, interval, _ in batch:
+        lines = templates.get(calendar_id, [])
+        needed = horizon - state[calendar_id]['upcoming'] if calendar_id in state else 0
+        if needed > 0 and any(line['status'] != 'cancelled' for line in lines):
+            due.append((calendar_id, customer_id, interval or 1, needed))
+    if not due:
+        return 0
+
+    anchors = {calendar_id: anchor_day for calendar_id, _, _, anchor_day in batch if anchor_day}
+    new_anchors = _first_delivery_days(
+        [calendar_id for calendar_id, _, _, _ in due if calendar_id not in anchors],
+        {calendar_id: row['first'] for calendar_id, row in state.items()}
+    )
+    anchors.update(new_anchors)
+
+    schedules = project_delivery_dates(
+        [state[calendar_id]['last'] for calendar_id, _, _, _ in due],
+        [anchors[calendar_id] for calendar_id, _, _, _ in due],
+        [interval for _, _, interval, _ in due],
+        [needed for _, _, _, needed in due],
+        today
+    )
+
+    items = [
+        CalendarItem(
+            calendar_id=calendar_id,
+            delivery_date=delivery_date,
+            product_variant_id=line['product_variant_id'],
+            quantity=line['quantity'],
+            status='scheduled'
+        )
+        for (calendar_id, _, _, _), dates in zip(due, schedules)
+        for delivery_date in dates
+        for line in templates[calendar_id]
+        if line['status'] != 'cancelled'
+    ]
+
+    with transaction.atomic():
+        if new_anchors:
+            SubscriptionCalendar.objects.filter(pk__in=list(new_anchors)).update(
+                delivery_anchor_day=models.Case(
+                    *[
+                        models.When(pk=calendar_id, then=models.Value(anchor_day))
+                        for calendar_id, anchor_day in new_anchors.items()
+                    ],
+                    output_field=models.PositiveSmallIntegerField()
+                )
+            )
+        CalendarItem.objects.bulk_create(items, batch_size=1000)
+        refresh_customer_summaries((customer_id for _, customer_id, _, _ in due), today)
+        for customer_id in {customer_id for _, customer_id, _, _ in due}:
+            invalidate_calendar_cache(customer_id)
+    return len(items)
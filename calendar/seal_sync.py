@@ -0,0 +1,181 @@
+from typing import Dict, List, Optional
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import models
+from services.seal_integration import (
+    DjangoSubscriptionCache,
+    SealSubscriptionService,
+    SubscriptionCache
+)
+from .leases import MAX_ATTEMPTS, claim_due, schedule_retry
+from .models import CalendarItem, SealSyncOutbox
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_seal_service: Optional[SealSubscriptionService] = None
+_subscription_cache: Optional[SubscriptionCache] = None
+_seal_service_lock = threading.Lock()
+_subscription_cache_lock = threading.Lock()
+
+def get_subscription_cache() -> Optional[SubscriptionCache]:
+    """Subscription cache selected by settings.SEAL_SUBSCRIPTION_CACHE
+
+    ``'local'`` keeps a per-process LRU; ``'django'`` uses the Django cache
+    backend so invalidations are shared between processes. Unset disables it.
+    """
+    global _subscription_cache
+    if _subscription_cache is None:
+        backend = getattr(settings, 'SEAL_SUBSCRIPTION_CACHE', None)
+        ttl = getattr(settings, 'SEAL_SUBSCRIPTION_CACHE_TTL', 300)
+        with _subscription_cache_lock:
+            if _subscription_cache is None and backend == 'local':
+                _subscription_cache = SubscriptionCache(
+                    max_size=getattr(settings, 'SEAL_SUBSCRIPTION_CACHE_SIZE', 10000),
+                    ttl=ttl
+                )
+            elif _subscription_cache is None and backend == 'django':
+                _subscription_cache = DjangoSubscriptionCache(ttl=ttl)
+    return _subscription_cache
+
+def invalidate_seal_subscription(subscription_id: str) -> None:
+    """Drop a subscription from the cache after Seal reports a change"""
+    subscription_cache = get_subscription_cache()
+    if subscription_cache is not None and subscription_id:
+        subscription_cache.invalidate(subscription_id)
+
+def get_seal_service() -> SealSubscriptionService:
+    """Process-wide Seal client, so syncs reuse pooled, warm connections"""
+    global _seal_service
+    if _seal_service is None:
+        # Resolved first: the cache has its own lock and must not nest in this one
+        cache = get_subscription_cache()
+        with _seal_service_lock:
+            if _seal_service is None:
+                _seal_service = SealSubscriptionService(
+                    settings.SEAL_API_KEY,
+                    settings.SHOP_URL,
+                    pool_size=getattr(settings, 'SEAL_POOL_SIZE', 10),
+                    cache=cache
+                )
+    return _seal_service
+
+def build_seal_update(calendar_items: List[CalendarItem]) -> Dict:
+    """Build the Seal update payload for changed items of one calendar"""
+    # The earliest still-scheduled change drives the next delivery
+    scheduled = [item for item in calendar_items if item.status == 'scheduled']
+    next_item = min(scheduled or calendar_items, key=lambda item: item.delivery_date)
+
+    update_data = {
+        'next_delivery_date': next_item.delivery_date.isoformat(),
+        'products': [
+            {
+                'variant_id': item.product_variant_id,
+                'quantity': item.quantity
+            }
+            for item in calendar_items
+        ]
+    }
+
+    if any(item.status == 'skipped' for item in calendar_items):
+        update_data['skip_next_delivery'] = True
+
+    return update_data
+
+def enqueue_seal_sync(calendar_items: List[CalendarItem]) -> None:
+    """Record pending Seal syncs for changed items
+
+    Call inside the transaction that saves the items, so the change and its
+    sync either both commit or both roll back.
+    """
+    SealSyncOutbox.objects.bulk_create([
+        SealSyncOutbox(
+            calendar_item=item,
+            seal_subscription_id=item.calendar.seal_subscription_id
+        )
+        for item in calendar_items
+    ])
+
+def claim_seal_syncs(batch_size: int = 500) -> List[SealSyncOutbox]:
+    """Claim due outbox rows, taking every due row of each subscription in the batch"""
+    return claim_due(SealSyncOutbox, 'seal_subscription_id', ('created_at', 'id'), batch_size)
+
+def dispatch_seal_syncs(
+    concurrency: int = 4,
+    batch_size: int = 500,
+    max_attempts: int = MAX_ATTEMPTS
+) -> Dict[str, int]:
+    """Push pending outbox rows to Seal until none are due
+
+    All pending changes for a subscription are coalesced into one
+    ``update_subscription`` call built from the items' current state.
+    """
+    stats = {'sent': 0, 'retried': 0, 'failed': 0}
+    seal_service = get_seal_service()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            entries = claim_seal_syncs(batch_size)
+            if not entries:
+                break
+
+            grouped = defaultdict(list)
+            for entry in entries:
+                grouped[entry.seal_subscription_id].append(entry)
+
+            # Load each changed item once, in its latest state
+            items = CalendarItem.objects.in_bulk({entry.calendar_item_id for entry in entries})
+            updates = {}
+            for subscription_id, group in grouped.items():
+                changed = {
+                    entry.calendar_item_id: items[entry.calendar_item_id]
+                    for entry in group
+                    if entry.calendar_item_id in items
+                }
+                # Rows for items deleted since the claim went with them (cascade)
+                if changed:
+                    updates[subscription_id] = build_seal_update(list(changed.values()))
+
+            errors = executor.map(
+                lambda subscription_id: _send_update(seal_service, subscription_id, updates[subscription_id]),
+                updates
+            )
+            for subscription_id, error in zip(updates, errors):
+                outcome = record_seal_sync_result(grouped[subscription_id], error, max_attempts)
+                stats[outcome] += len(grouped[subscription_id])
+
+    logger.info(
+        f"Seal sync dispatched: {stats['sent']} changes sent, "
+        f"{stats['retried']} retried, {stats['failed']} failed"
+    )
+    return stats
+
+def record_seal_sync_result(
+    entries: List[SealSyncOutbox],
+    error: Optional[str],
+    max_attempts: int = MAX_ATTEMPTS
+) -> str:
+    """Mark one subscription's outbox rows as sent, rescheduled or failed"""
+    rows = SealSyncOutbox.objects.filter(id__in=[entry.id for entry in entries])
+    if error is None:
+        rows.update(status='sent', attempts=models.F('attempts') + 1, last_error='')
+        return 'sent'
+
+    attempts = max(entry.attempts for entry in entries) + 1
+    outcome = schedule_retry(rows, attempts, error, max_attempts, failed_status='failed')
+    if outcome == 'failed':
+        logger.error(
+            f"Seal sync for subscription {entries[0].seal_subscription_id} "
+            f"failed after {attempts} attempts: {error}"
+        )
+    return outcome
+
+def _send_update(seal_service: SealSubscriptionService, subscription_id: str, update_data: Dict) -> Optional[str]:
+    """Send one coalesced update, returning the error if it failed"""
+    try:
+        seal_service.update_subscription(subscription_id, update_data)
+        return None
+    except Exception as e:
+        return str(e)
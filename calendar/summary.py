@@ -0,0 +1,119 @@
+from typing import Any, Dict, Iterable, Optional
+from datetime import date
+from itertools import islice
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import SubscriptionCalendar, CalendarItem, CalendarSummary
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SUMMARY_DELIVERIES = 5  # upcoming deliveries kept in each summary
+
+def refresh_customer_summaries(customer_ids: Iterable[str], today: Optional[date] = None) -> int:
+    """Recompute the summaries of the given customers
+
+    Costs one read of the customers' upcoming scheduled items and one
+    upsert, whatever the number of customers. Call it inside the transaction
+    that changed the items so the summary never disagrees with them.
+    """
+    customer_ids = set(customer_ids)
+    if not customer_ids:
+        return 0
+    today = today or timezone.now().date()
+    limit = getattr(settings, 'CALENDAR_SUMMARY_DELIVERIES', DEFAULT_SUMMARY_DELIVERIES)
+
+    summaries = {
+        customer_id: CalendarSummary(customer_id=customer_id, upcoming_deliveries=[])
+        for customer_id in customer_ids
+    }
+    for customer_id, delivery_date, item_id, variant_id, quantity in CalendarItem.objects.filter(
+        calendar__customer_id__in=customer_ids,
+        status='scheduled',
+        delivery_date__gte=today
+    ).order_by('calendar__customer_id', 'delivery_date', 'id').values_list(
+        'calendar__customer_id', 'delivery_date', 'id', 'product_variant_id', 'quantity'
+    ):
+        summary = summaries[customer_id]
+        summary.scheduled_count += 1
+        deliveries = summary.upcoming_deliveries
+        if not deliveries or deliveries[-1]['date'] != delivery_date.isoformat():
+            if len(deliveries) == limit:
+                continue
+            deliveries.append({'date': delivery_date.isoformat(), 'items': []})
+        deliveries[-1]['items'].append([item_id, variant_id, quantity])
+
+    for summary in summaries.values():
+        if summary.upcoming_deliveries:
+            summary.next_delivery_date = date.fromisoformat(summary.upcoming_deliveries[0]['date'])
+
+    CalendarSummary.objects.bulk_create(
+        summaries.values(),
+        update_conflicts=True,
+        unique_fields=['customer'],
+        update_fields=['next_delivery_date', 'scheduled_count', 'upcoming_deliveries', 'updated_at']
+    )
+    return len(summaries)
+
+def rebuild_calendar_summaries(batch_size: int = 1000) -> int:
+    """Backfill or rebuild the summary of every customer with a calendar
+
+    Customers are streamed in batches, each refreshed in its own transaction.
+    """
+    customer_ids = SubscriptionCalendar.objects.order_by('customer_id').values_list(
+        'customer_id', flat=True
+    ).distinct().iterator(chunk_size=batch_size)
+
+    rebuilt = 0
+    today = timezone.now().date()
+    while True:
+        batch = list(islice(customer_ids, batch_size))
+        if not batch:
+            break
+        with transaction.atomic():
+            rebuilt += refresh_customer_summaries(batch, today)
+
+    logger.info(f"Rebuilt {rebuilt} calendar summaries")
+    return rebuilt
+
+def get_calendar_summary(customer_id: str) -> Optional[Dict[str, Any]]:
+    """Read a customer's summary by primary key
+
+    Deliveries whose date has passed since the last refresh are dropped on
+    read. The summary is refreshed in place only when it has not been built
+    yet or every stored delivery has passed. Returns None for customers
+    without a calendar.
+    """
+    today = timezone.now().date()
+    summary = CalendarSummary.objects.filter(pk=customer_id).first()
+    if summary is None:
+        if not SubscriptionCalendar.objects.filter(customer_id=customer_id).exists():
+            return None
+        refresh_customer_summaries([customer_id], today)
+        summary = CalendarSummary.objects.get(pk=customer_id)
+
+    upcoming = [
+        delivery for delivery in summary.upcoming_deliveries
+        if delivery['date'] >= today.isoformat()
+    ]
+    passed = summary.upcoming_deliveries[:len(summary.upcoming_deliveries) - len(upcoming)]
+    scheduled_count = summary.scheduled_count - sum(len(delivery['items']) for delivery in passed)
+    if passed and not upcoming and scheduled_count > 0:
+        refresh_customer_summaries([customer_id], today)
+        return get_calendar_summary(customer_id)
+
+    return {
+        'next_delivery_date': upcoming[0]['date'] if upcoming else None,
+        'scheduled_count': scheduled_count,
+        'upcoming_deliveries': [
+            {
+                'delivery_date': delivery['date'],
+                'items': [
+                    {'id': item_id, 'product_variant_id': variant_id, 'quantity': quantity}
+                    for item_id, variant_id, quantity in delivery['items']
+                ]
+            }
+            for delivery in upcoming
+        ],
+    }
@@ -1,6 +1,7 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, date
 from django.utils import timezone
+import base64
 import logging
 
 logger = logging.getLogger(__name__)
@@ -30,14 +31,50 @@ def validate_calendar_item_data(data: Dict[str, Any]) -> Optional[Dict[str, str]
     
     return errors if errors else None
 
-def format_calendar_item(item: 'CalendarItem') -> Dict[str, Any]:
-    """Format calendar item for API response"""
+def format_calendar_item(item: 'CalendarItem', calendar: Optional['SubscriptionCalendar'] = None) -> Dict[str, Any]:
+    """Format calendar item for API response
+    
+    Pass the item's ``calendar`` when formatting several items of one
+    calendar; otherwise select it with the items (``select_related``), or
+    every item costs a query.
+    """
+    calendar = calendar or item.calendar
     return {
         'id': item.id,
         'delivery_date': item.delivery_date.isoformat(),
         'product_variant_id': item.product_variant_id,
         'quantity': item.quantity,
         'status': item.status,
-        'created_at': item.calendar.created_at.isoformat(),
-        'updated_at': item.calendar.updated_at.isoformat()
-    } 
\ No newline at end of file
+        'created_at': calendar.created_at.isoformat(),
+        'updated_at': calendar.updated_at.isoformat()
+    }
+
+def encode_item_cursor(delivery_date: date, item_id: int) -> str:
+    """Encode a (delivery_date, id) position as an opaque pagination cursor"""
+    position = f"{delivery_date.isoformat()}:{item_id}"
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def decode_item_cursor(cursor: str) -> Tuple[date, int]:
+    """Decode a pagination cursor, raising ValueError if it is malformed"""
+    try:
+        position = base64.urlsafe_b64decode(cursor.encode()).decode()
+        delivery_date, item_id = position.split(':')
+        return date.fromisoformat(delivery_date), int(item_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def merge_product_changes(product_changes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Collapse product changes to one net change per variant
+    
+    Later values override earlier ones, except that once a change takes a
+    variant off the schedule, later changes to it are dropped: applied in
+    sequence they would no longer match a scheduled item.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for change in product_changes:
+        existing = merged.get(change['variant_id'])
+        if existing is None:
+            merged[change['variant_id']] = dict(change)
+        elif existing.get('status', 'scheduled') == 'scheduled':
+            existing.update(change)
+    return list(merged.values())
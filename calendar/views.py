@@ -1,23 +1,49 @@
-from django.db.models import Prefetch
-from django.views.decorators.cache import cache_page
+from django.db.models import Prefetch, Q
 from django.core.paginator import Paginator
-from django.http import JsonResponse
-from services.seal_integration import SealSubscriptionService
-from .models import SubscriptionCalendar, CalendarItem
+from django.http import HttpResponse, JsonResponse
+from services import metrics
+from .models import SubscriptionCalendar, CalendarItem, SealSyncOutbox
+from .webhook_queue import enqueue_webhook_event, webhook_queue_depth
+from .cache import calendar_cache_stats, get_cached_calendar, invalidate_calendar_cache
+from .summary import get_calendar_summary, refresh_customer_summaries
+from .archival import calendar_history
+from .seal_sync import (
+    build_seal_update,
+    enqueue_seal_sync,
+    get_seal_service,
+    get_subscription_cache,
+    invalidate_seal_subscription
+)
+from .utils import (
+    decode_item_cursor,
+    encode_item_cursor,
+    merge_product_changes,
+    validate_calendar_item_data
+)
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 import json
-from typing import Dict, List
+from datetime import datetime
+from typing import Dict, Iterable, List
 from django.utils import timezone
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 import logging
 
 logger = logging.getLogger(__name__)
 
-@cache_page(60 * 15)  # Cache for 15 minutes
 def calendar_view(request, customer_id):
+    # Cached per customer under a version that every write path bumps
     page = request.GET.get('page', 1)
+    body = get_cached_calendar(
+        customer_id,
+        f"page:{page}",
+        lambda: build_calendar_page(customer_id, page)
+    )
+    return HttpResponse(body, content_type='application/json')
+
+def build_calendar_page(customer_id, page) -> Dict:
+    """Build one page of the calendar_view payload"""
     items_per_page = 20
     
     # Optimize queries with select_related and prefetch_related
@@ -57,7 +83,139 @@ def calendar_view(request, customer_id):
         }
     }
     
-    return JsonResponse(calendar_data)
+    return calendar_data
+
+@require_http_methods(["GET"])
+def calendar_summary_view(request, customer_id):
+    """Next deliveries for the storefront, read from the customer's summary
+    
+    A single primary-key lookup, independent of how many items the
+    customer's calendars hold.
+    """
+    summary = get_calendar_summary(customer_id)
+    if summary is None:
+        return JsonResponse({'error': 'Calendar not found'}, status=404)
+    return JsonResponse(summary)
+
+@require_http_methods(["GET"])
+def calendar_history_view(request, customer_id):
+    """Page a customer's settled deliveries, newest first
+    
+    Archived items are only read with ``?include_archived=1``.
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    
+    cursor = request.GET.get('cursor')
+    try:
+        before = decode_item_cursor(cursor) if cursor else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    # Fetch one extra row to learn whether another page exists
+    items = calendar_history(
+        customer_id,
+        before=before,
+        limit=limit + 1,
+        include_archived=request.GET.get('include_archived') in ('1', 'true')
+    )
+    has_next = len(items) > limit
+    items = items[:limit]
+    
+    return JsonResponse({
+        'items': items,
+        'pagination': {
+            'next_cursor': (
+                encode_item_cursor(items[-1]['delivery_date'], items[-1]['id'])
+                if has_next else None
+            ),
+            'has_next': has_next
+        }
+    })
+
+@require_http_methods(["GET"])
+def calendar_items_view(request, customer_id):
+    """Page a customer's scheduled items by a (delivery_date, id) cursor
+    
+    Unlike calendar_view this pages over items rather than calendars and
+    never counts rows, so every page costs one indexed range scan no matter
+    how deep into the delivery history it is.
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    
+    items = CalendarItem.objects.filter(
+        calendar__customer_id=customer_id,
+        status='scheduled'
+    )
+    
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            delivery_date, item_id = decode_item_cursor(cursor)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        
+        # The redundant lower bound keeps the scan a single index range
+        items = items.filter(
+            delivery_date__gte=delivery_date
+        ).filter(
+            Q(delivery_date__gt=delivery_date) | Q(delivery_date=delivery_date, id__gt=item_id)
+        )
+    
+    # Fetch one extra row to learn whether another page exists
+    page = list(
+        items.order_by('delivery_date', 'id').values(
+            'id',
+            'delivery_date',
+            'product_variant_id',
+            'quantity',
+            'status'
+        )[:limit + 1]
+    )
+    has_next = len(page) > limit
+    page = page[:limit]
+    
+    return JsonResponse({
+        'items': page,
+        'pagination': {
+            'next_cursor': (
+                encode_item_cursor(page[-1]['delivery_date'], page[-1]['id'])
+                if has_next else None
+            ),
+            'has_next': has_next
+        }
+    })
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Expose collected metrics in the Prometheus text format"""
+    if not metrics.is_enabled():
+        return JsonResponse({'error': 'Metrics are disabled'}, status=404)
+    
+    # Queue depths are sampled at scrape time so the hot paths never count rows
+    depth = webhook_queue_depth()
+    for status in ('pending', 'processing', 'dead'):
+        metrics.set_gauge('webhook_queue_depth', depth.get(status, 0), status=status)
+    metrics.set_gauge(
+        'seal_sync_outbox_depth',
+        SealSyncOutbox.objects.filter(status__in=['pending', 'processing']).count()
+    )
+    for name, value in calendar_cache_stats().items():
+        metrics.set_gauge(f'calendar_cache_{name}', value)
+    subscription_cache = get_subscription_cache()
+    if subscription_cache is not None:
+        for name, value in subscription_cache.stats().items():
+            metrics.set_gauge(f'seal_subscription_cache_{name}', value)
+    
+    return HttpResponse(
+        metrics.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -65,6 +223,14 @@ def webhook_handler(request):
     """Handle webhooks from Seal Subscriptions"""
     try:
         data = json.loads(request.body)
+        
+        # Queue mode: persist the raw event and let the worker pool apply it
+        if getattr(settings, 'SEAL_WEBHOOK_QUEUE', False):
+            _, created = enqueue_webhook_event(data)
+            if not created:
+                return JsonResponse({'status': 'duplicate'})
+            return JsonResponse({'status': 'queued'}, status=202)
+        
         event_type = data.get('event_type')
         
         if event_type == 'subscription.updated':
@@ -80,31 +246,144 @@ def webhook_handler(request):
 def update_calendar_item(request, item_id):
     """Update a calendar item"""
     try:
-        item = CalendarItem.objects.get(id=item_id)
+        item = CalendarItem.objects.select_related('calendar').get(id=item_id)
         data = json.loads(request.body)
+        sync = data.get('sync_with_seal', False)
         
-        # Update calendar item
-        item.delivery_date = data.get('delivery_date', item.delivery_date)
-        item.quantity = data.get('quantity', item.quantity)
-        item.status = data.get('status', item.status)
-        item.save()
+        with transaction.atomic():
+            # Update calendar item
+            item.delivery_date = data.get('delivery_date', item.delivery_date)
+            item.quantity = data.get('quantity', item.quantity)
+            item.status = data.get('status', item.status)
+            item.save()
+            refresh_customer_summaries([item.calendar.customer_id])
+            invalidate_calendar_cache(item.calendar.customer_id)
+            
+            if sync and use_seal_sync_outbox():
+                enqueue_seal_sync([item])
         
         # Sync with Seal if needed
-        if data.get('sync_with_seal', False):
+        if sync and not use_seal_sync_outbox():
             sync_with_seal(item)
             
         return JsonResponse({'status': 'success'})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
+@require_http_methods(["POST"])
+def batch_update_calendar_items(request):
+    """Update many calendar items in a single transaction
+    
+    Expects ``{"items": [{"id": ..., "delivery_date": ..., ...}], "sync_with_seal": bool}``.
+    Every update is validated before anything is written; the targets are
+    loaded in one query and saved with one bulk UPDATE, and Seal receives at
+    most one sync per affected subscription.
+    """
+    try:
+        data = json.loads(request.body)
+        updates = data.get('items') or []
+        if not updates:
+            return JsonResponse({'error': 'No items to update'}, status=400)
+        
+        errors = {}
+        for index, update in enumerate(updates):
+            try:
+                update['id'] = int(update['id'])
+            except (KeyError, TypeError, ValueError):
+                errors[str(index)] = {'id': 'Invalid item ID'}
+                continue
+            item_errors = validate_calendar_item_data(update)
+            if item_errors:
+                errors[str(update['id'])] = item_errors
+        if errors:
+            return JsonResponse({'errors': errors}, status=400)
+        
+        with transaction.atomic():
+            items = CalendarItem.objects.select_related('calendar').in_bulk(
+                [update['id'] for update in updates]
+            )
+            missing = [update['id'] for update in updates if update['id'] not in items]
+            if missing:
+                return JsonResponse({'error': f"Calendar items not found: {missing}"}, status=404)
+            
+            for update in updates:
+                item = items[update['id']]
+                if 'delivery_date' in update:
+                    item.delivery_date = datetime.fromisoformat(update['delivery_date']).date()
+                if 'quantity' in update:
+                    item.quantity = int(update['quantity'])
+                if 'status' in update:
+                    item.status = update['status']
+            
+            CalendarItem.objects.bulk_update(
+                items.values(),
+                ['delivery_date', 'quantity', 'status']
+            )
+            
+            calendars = {}
+            for item in items.values():
+                calendars.setdefault(item.calendar_id, (item.calendar, []))[1].append(item)
+            refresh_customer_summaries(calendar.customer_id for calendar, _ in calendars.values())
+            for calendar, _ in calendars.values():
+                invalidate_calendar_cache(calendar.customer_id)
+            
+            if data.get('sync_with_seal', False) and use_seal_sync_outbox():
+                enqueue_seal_sync(list(items.values()))
+        
+        # One Seal sync per subscription, outside the transaction
+        sync_failed = []
+        if data.get('sync_with_seal', False) and not use_seal_sync_outbox():
+            for calendar, calendar_items in calendars.values():
+                try:
+                    sync_calendar_with_seal(calendar, calendar_items)
+                except Exception:
+                    sync_failed.append(calendar.seal_subscription_id)
+        
+        return JsonResponse({
+            'status': 'success',
+            'updated': len(items),
+            'sync_failed': sync_failed
+        })
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
 def handle_subscription_update(data: Dict) -> None:
     """Handle subscription update webhook from Seal"""
+    subscription_id = data.get('subscription_id')
     try:
-        subscription_id = data.get('subscription_id')
-        calendar = SubscriptionCalendar.objects.get(
-            seal_subscription_id=subscription_id
-        )
-        
+        apply_subscription_update(data)
+    except SubscriptionCalendar.DoesNotExist:
+        logger.error(f"Calendar not found for subscription {subscription_id}")
+    except Exception as e:
+        logger.error(f"Error handling subscription update: {str(e)}")
+
+def handle_subscription_cancellation(data: Dict) -> None:
+    """Handle subscription cancellation webhook from Seal"""
+    subscription_id = data.get('subscription_id')
+    try:
+        apply_subscription_cancellation(data)
+    except SubscriptionCalendar.DoesNotExist:
+        logger.error(f"Calendar not found for subscription {subscription_id}")
+    except Exception as e:
+        logger.error(f"Error handling subscription cancellation: {str(e)}")
+
+def apply_webhook_event(data: Dict) -> None:
+    """Apply a webhook event, raising on failure so callers can retry"""
+    event_type = data.get('event_type')
+    
+    if event_type == 'subscription.updated':
+        apply_subscription_update(data)
+    elif event_type == 'subscription.cancelled':
+        apply_subscription_cancellation(data)
+
+def apply_subscription_update(data: Dict) -> None:
+    """Apply subscription changes to the matching calendar"""
+    invalidate_seal_subscription(data.get('subscription_id'))
+    calendar = SubscriptionCalendar.objects.get(
+        seal_subscription_id=data.get('subscription_id')
+    )
+    
+    with transaction.atomic():
         # Update calendar items based on subscription changes
         if 'next_delivery_date' in data:
             CalendarItem.objects.filter(
@@ -113,22 +392,29 @@ def handle_subscription_update(data: Dict) -> None:
             ).update(
                 delivery_date=data['next_delivery_date']
             )
+            # Seal rescheduled the subscription, so later deliveries follow the new day
+            SubscriptionCalendar.objects.filter(pk=calendar.pk).update(
+                delivery_anchor_day=datetime.fromisoformat(data['next_delivery_date'][:10]).day
+            )
             
         if 'product_changes' in data:
-            update_calendar_products(calendar, data['product_changes'])
-            
-    except SubscriptionCalendar.DoesNotExist:
-        logger.error(f"Calendar not found for subscription {subscription_id}")
-    except Exception as e:
-        logger.error(f"Error handling subscription update: {str(e)}")
+            update_calendar_products(calendar, data['product_changes'], refresh_summary=False)
+        
+        # Once for both kinds of change, even if the product changes were empty
+        if 'next_delivery_date' in data or data.get('product_changes'):
+            refresh_customer_summaries([calendar.customer_id])
+        invalidate_calendar_cache(calendar.customer_id)
 
-def handle_subscription_cancellation(data: Dict) -> None:
-    """Handle subscription cancellation webhook from Seal"""
-    try:
-        subscription_id = data.get('subscription_id')
-        calendar = SubscriptionCalendar.objects.get(
-            seal_subscription_id=subscription_id
-        )
+def apply_subscription_cancellation(data: Dict) -> None:
+    """Cancel the remaining deliveries and deactivate the matching calendar"""
+    invalidate_seal_subscription(data.get('subscription_id'))
+    calendar = SubscriptionCalendar.objects.get(
+        seal_subscription_id=data.get('subscription_id')
+    )
+    
+    with transaction.atomic():
+        # Stops the nightly job scheduling deliveries past the ones cancelled below
+        SubscriptionCalendar.objects.filter(pk=calendar.pk).update(is_active=False)
         
         # Mark all future calendar items as cancelled
         CalendarItem.objects.filter(
@@ -136,57 +422,95 @@ def handle_subscription_cancellation(data: Dict) -> None:
             delivery_date__gte=timezone.now().date(),
             status='scheduled'
         ).update(status='cancelled')
-        
-    except SubscriptionCalendar.DoesNotExist:
-        logger.error(f"Calendar not found for subscription {subscription_id}")
-    except Exception as e:
-        logger.error(f"Error handling subscription cancellation: {str(e)}")
+        refresh_customer_summaries([calendar.customer_id])
+        invalidate_calendar_cache(calendar.customer_id)
+
+def use_seal_sync_outbox() -> bool:
+    """Whether Seal syncs go through the outbox instead of the request"""
+    return getattr(settings, 'SEAL_SYNC_OUTBOX', False)
 
 def sync_with_seal(calendar_item: CalendarItem) -> None:
     """Sync calendar item changes with Seal subscription"""
+    sync_calendar_with_seal(calendar_item.calendar, [calendar_item])
+
+def sync_calendar_with_seal(calendar: SubscriptionCalendar, calendar_items: List[CalendarItem]) -> None:
+    """Sync changes to several items of one calendar with a single Seal update"""
     try:
-        calendar = calendar_item.calendar
-        seal_service = SealSubscriptionService(
-            settings.SEAL_API_KEY,
-            settings.SHOP_URL
-        )
-        
-        # Prepare update data
-        update_data = {
-            'next_delivery_date': calendar_item.delivery_date.isoformat(),
-            'products': [
-                {
-                    'variant_id': calendar_item.product_variant_id,
-                    'quantity': calendar_item.quantity
-                }
-            ]
-        }
-        
-        if calendar_item.status == 'skipped':
-            update_data['skip_next_delivery'] = True
-        
         # Update subscription in Seal
-        seal_service.update_subscription(
+        get_seal_service().update_subscription(
             calendar.seal_subscription_id,
-            update_data
+            build_seal_update(calendar_items)
         )
         
     except Exception as e:
         logger.error(f"Error syncing with Seal: {str(e)}")
         raise
 
-def update_calendar_products(calendar: SubscriptionCalendar, product_changes: List[Dict]) -> None:
+def update_calendar_products(
+    calendar: SubscriptionCalendar,
+    product_changes: List[Dict],
+    refresh_summary: bool = True
+) -> None:
     """Update calendar items based on product changes"""
+    update_calendars_products([calendar], product_changes, refresh_summaries=refresh_summary)
+
+def update_calendars_products(
+    calendars: Iterable[SubscriptionCalendar],
+    product_changes: List[Dict],
+    refresh_summaries: bool = True
+) -> int:
+    """Apply one set of product changes to the scheduled items of many calendars
+    
+    The whole change set is written with a single UPDATE, using CASE/WHEN
+    on product_variant_id, inside one transaction. Callers that make other
+    changes in the same transaction can pass ``refresh_summaries=False``
+    and refresh the calendar summaries once themselves.
+    """
     try:
-        for change in product_changes:
-            CalendarItem.objects.filter(
-                calendar=calendar,
-                status='scheduled',
-                product_variant_id=change['variant_id']
-            ).update(
-                quantity=change.get('quantity', models.F('quantity')),
-                status=change.get('status', models.F('status'))
+        calendars = list(calendars)
+        changes = merge_product_changes(product_changes)
+        if not calendars or not changes:
+            return 0
+        
+        fields = {}
+        quantity_cases = [
+            models.When(product_variant_id=change['variant_id'], then=models.Value(change['quantity']))
+            for change in changes if 'quantity' in change
+        ]
+        if quantity_cases:
+            fields['quantity'] = models.Case(
+                *quantity_cases,
+                default=models.F('quantity'),
+                output_field=models.PositiveIntegerField()
+            )
+        
+        status_cases = [
+            models.When(product_variant_id=change['variant_id'], then=models.Value(change['status']))
+            for change in changes if 'status' in change
+        ]
+        if status_cases:
+            fields['status'] = models.Case(
+                *status_cases,
+                default=models.F('status'),
+                output_field=models.CharField()
             )
+        
+        if not fields:
+            return 0
+        
+        with transaction.atomic():
+            updated = CalendarItem.objects.filter(
+                calendar__in=calendars,
+                status='scheduled',
+                product_variant_id__in=[change['variant_id'] for change in changes]
+            ).update(**fields)
+            
+            if refresh_summaries:
+                refresh_customer_summaries(calendar.customer_id for calendar in calendars)
+            for customer_id in {calendar.customer_id for calendar in calendars}:
+                invalidate_calendar_cache(customer_id)
+        
+        return updated
     except Exception as e:
         logger.error(f"Error updating calendar products: {str(e)}")
-        raise
\ No newline at end of file
+        raise
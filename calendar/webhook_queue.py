@@ -0,0 +1,203 @@
+from typing import Dict, List, Optional, Tuple
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.db import close_old_connections, models, transaction
+from django.utils.dateparse import parse_datetime
+from services import metrics
+from .models import WebhookEvent
+from .leases import MAX_ATTEMPTS, claim_due, schedule_retry
+from .utils import merge_product_changes
+import logging
+
+logger = logging.getLogger(__name__)
+
+def enqueue_webhook_event(data: Dict) -> Tuple[WebhookEvent, bool]:
+    """Persist a raw webhook event for asynchronous processing
+    
+    Returns ``(event, created)``; ``created`` is False when an event with the
+    same Seal event ID was already received.
+    """
+    fields = {
+        'event_type': data.get('event_type') or '',
+        'subscription_id': data.get('subscription_id') or '',
+        'payload': data,
+        'occurred_at': _event_timestamp(data),
+    }
+    
+    event_id = data.get('event_id') or data.get('id')
+    if not event_id:
+        return WebhookEvent.objects.create(**fields), True
+    
+    return WebhookEvent.objects.get_or_create(event_id=str(event_id), defaults=fields)
+
+def _event_timestamp(data: Dict):
+    """Parse the time Seal says the event happened, if it sent one"""
+    value = data.get('timestamp') or data.get('created_at')
+    if not value:
+        return None
+    try:
+        return parse_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+def claim_webhook_events(batch_size: int = 100) -> List[WebhookEvent]:
+    """Claim the next batch of due events
+
+    Events are applied per subscription in event order, so a subscription's
+    events are claimed together and never while an older one is still
+    backing off or leased elsewhere; see ``claim_due``.
+    """
+    return claim_due(WebhookEvent, 'subscription_id', ('received_at', 'id'), batch_size)
+
+def drain_webhook_queue(
+    concurrency: int = 4,
+    batch_size: int = 100,
+    max_attempts: int = MAX_ATTEMPTS
+) -> Dict[str, int]:
+    """Process queued webhook events until no due events remain
+
+    Claimed events are grouped per subscription and each group is coalesced
+    into its net change before being applied, so a burst of updates for one
+    subscription costs a single set of writes. Groups are applied on a pool
+    of ``concurrency`` threads. Failed events are retried with exponential
+    backoff and dead-lettered once they have failed ``max_attempts`` times.
+    """
+    stats = {'processed': 0, 'retried': 0, 'dead': 0}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            events = claim_webhook_events(batch_size)
+            if not events:
+                break
+
+            groups = group_webhook_events(events)
+            errors = executor.map(_process_group, groups)
+            results = [
+                (event, error)
+                for group, error in zip(groups, errors)
+                for event in group
+            ]
+            outcome = record_webhook_results(results, max_attempts)
+            for key, count in outcome.items():
+                stats[key] += count
+                metrics.increment('webhook_events_total', count, outcome=key)
+
+    logger.info(
+        f"Webhook queue drained: {stats['processed']} processed, "
+        f"{stats['retried']} retried, {stats['dead']} dead-lettered"
+    )
+    return stats
+
+def record_webhook_results(
+    results: List[Tuple[WebhookEvent, Optional[str]]],
+    max_attempts: int = MAX_ATTEMPTS
+) -> Dict[str, int]:
+    """Mark claimed events as processed, rescheduled or dead"""
+    stats = {'processed': 0, 'retried': 0, 'dead': 0}
+    succeeded = [event.id for event, error in results if error is None]
+
+    if succeeded:
+        WebhookEvent.objects.filter(id__in=succeeded).update(
+            status='processed',
+            attempts=models.F('attempts') + 1,
+            last_error=''
+        )
+        stats['processed'] = len(succeeded)
+
+    for event, error in results:
+        if error is None:
+            continue
+
+        attempts = event.attempts + 1
+        outcome = schedule_retry(
+            WebhookEvent.objects.filter(id=event.id),
+            attempts,
+            error,
+            max_attempts,
+            failed_status='dead'
+        )
+        if outcome == 'dead':
+            logger.error(f"Webhook event {event.id} dead-lettered after {attempts} attempts: {error}")
+        stats[outcome] += 1
+
+    return stats
+
+def webhook_queue_depth() -> Dict[str, int]:
+    """Number of queued events in each status"""
+    return dict(
+        WebhookEvent.objects.exclude(
+            status='processed'
+        ).values_list('status').annotate(count=models.Count('id'))
+    )
+
+def group_webhook_events(events: List[WebhookEvent]) -> List[List[WebhookEvent]]:
+    """Group events by subscription, each group ordered by event time"""
+    groups = defaultdict(list)
+    for event in events:
+        # Events without a subscription can't be coalesced; keep them apart
+        key = event.subscription_id or f"event:{event.id}"
+        groups[key].append(event)
+
+    return [
+        sorted(group, key=lambda event: (event.occurred_at or event.received_at, event.id))
+        for group in groups.values()
+    ]
+
+def coalesce_webhook_events(payloads: List[Dict]) -> List[Dict]:
+    """Merge an ordered run of one subscription's events into its net changes
+
+    Consecutive updates fold into one: the latest ``next_delivery_date``
+    wins and product changes are merged per variant, later values
+    overriding earlier ones. An update is only folded when the result is
+    the same as applying the events one by one; otherwise, and around
+    cancellations, the events stay separate. Repeated cancellations collapse.
+    """
+    merged: List[Dict] = []
+    for payload in payloads:
+        event_type = payload.get('event_type')
+        previous = merged[-1] if merged else None
+
+        if previous is not None and previous.get('event_type') == event_type:
+            if event_type == 'subscription.cancelled':
+                continue
+            if event_type == 'subscription.updated' and _can_fold_update(previous, payload):
+                _fold_update(previous, payload)
+                continue
+
+        merged.append(dict(payload))
+    return merged
+
+def _can_fold_update(previous: Dict, payload: Dict) -> bool:
+    """A later date change can't be folded past earlier status changes
+
+    Updates move dates before applying product changes, so folding would
+    also move the items the earlier event took off the schedule.
+    """
+    if 'next_delivery_date' not in payload:
+        return True
+    return not any('status' in change for change in previous.get('product_changes', []))
+
+def _fold_update(previous: Dict, payload: Dict) -> None:
+    """Fold a subscription.updated payload into the preceding one"""
+    if 'next_delivery_date' in payload:
+        previous['next_delivery_date'] = payload['next_delivery_date']
+
+    if 'product_changes' in payload:
+        previous['product_changes'] = merge_product_changes(
+            previous.get('product_changes', []) + payload['product_changes']
+        )
+
+def _process_group(events: List[WebhookEvent]) -> Optional[str]:
+    """Apply one subscription's events on a worker thread, returning the error if it failed"""
+    from .views import apply_webhook_event
+
+    try:
+        with metrics.timer('webhook_apply_seconds'), transaction.atomic():
+            for payload in coalesce_webhook_events([event.payload for event in events]):
+                apply_webhook_event(payload)
+        return None
+    except Exception as e:
+        return str(e)
+    finally:
+        # Worker threads hold their own connections; drop broken or expired ones
+        close_old_connections()
@@ -1,79 +1,572 @@
-from typing import Dict, List
-from services.seal_integration import SealSubscriptionService
-from calendar.models import SubscriptionCalendar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from datetime import datetime
+from itertools import islice
+from operator import itemgetter
+from django.db import DatabaseError, connections, models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from services import metrics
+from services.query_profiler import profile_queries
+from services.seal_integration import SealSubscriptionService, TokenBucket
+from calendar.models import SubscriptionCalendar, CalendarItem, ArchivedCalendarItem, MigrationJournal
+from calendar.scheduling import add_months
+from calendar.summary import refresh_customer_summaries
+import logging
+import os
+import time
 
-def migrate_subscription_data(seal_api_key: str, shop_url: str):
-    """Handles the complete migration process"""
-    seal_service = SealSubscriptionService(seal_api_key, shop_url)
+logger = logging.getLogger(__name__)
+
+# Precompiled lookup tables for the transform stage
+BILLING_INTERVALS = {
+    'monthly': {'interval': 'month', 'interval_count': 1},
+    'bimonthly': {'interval': 'month', 'interval_count': 2},
+    'quarterly': {'interval': 'month', 'interval_count': 3},
+    # Add other mappings as needed
+}
+# Calendars store their interval in months; the export names it for the transform
+_INTERVAL_NAMES = {
+    spec['interval_count']: name
+    for name, spec in BILLING_INTERVALS.items()
+    if spec['interval'] == 'month'
+}
+_PRODUCT_FIELDS = itemgetter('product_variant_id', 'quantity', 'price')
+_SEAL_PRODUCT_KEYS = ('variant_id', 'quantity', 'price')
+MAX_REPORTED_ERRORS = 1000  # per-record failures kept in a run's stats
+# Queries each phase may run per chunk (export, transform, journal) or per
+# batch (writeback) before a warning is logged; more means a query per record
+PHASE_QUERY_BUDGETS = {
+    'export': 2,
+    'transform': 0,
+    'journal': 2,
+    'writeback': 6,
+}
+
+def migrate_subscription_data(
+    seal_api_key: str,
+    shop_url: str,
+    concurrency: int = 1,
+    requests_per_second: Optional[float] = None,
+    chunk_size: int = 2000,
+    queue_size: Optional[int] = None,
+    writeback_batch_size: int = 500,
+    writeback_interval: float = 5.0,
+    resume: bool = True,
+    service_options: Optional[Dict[str, Any]] = None,
+    pk_range: Optional[Tuple[int, int]] = None,
+    query_budget: Optional[int] = None
+) -> Dict[str, Any]:
+    """Handles the complete migration process
     
-    # Step 1: Export existing data
-    existing_subscriptions = export_current_subscriptions()
+    Export, transform and import are chained generators, so records stream
+    from the database to Seal in chunks and memory stays flat regardless of
+    how many calendars the shop has.
     
-    # Step 2: Transform data
-    seal_formatted_data = transform_to_seal_format(existing_subscriptions)
+    Progress is recorded in MigrationJournal: records are marked pending as
+    they are submitted, then created or failed. With ``resume`` set,
+    customers already marked as created are skipped, so rerunning after a
+    crash only processes the remainder; creates carry idempotency keys so a
+    record that succeeded in Seal but was not yet journaled is not
+    duplicated.
     
-    # Step 3: Import to Seal
-    for subscription_data in seal_formatted_data:
-        try:
-            # Create subscription in Seal
-            seal_subscription = seal_service.create_subscription(subscription_data)
+    ``service_options`` are passed through to SealSubscriptionService (retry,
+    timeout and circuit breaker settings). ``pk_range`` limits the run to
+    calendars with ``start <= pk < end``; see ``migrate_in_partitions``.
+    
+    Each phase's queries are profiled against ``PHASE_QUERY_BUDGETS``, and
+    the whole run against ``query_budget`` when one is given.
+    
+    A write-back flush that fails is counted in ``writeback_errors`` rather
+    than against the records it carried, which stay queued for the next
+    flush; one that still fails on exit aborts the run.
+    """
+    rate_limiter = TokenBucket(requests_per_second) if requests_per_second else None
+    options = {'pool_size': max(concurrency, 10), **(service_options or {})}
+    seal_service = SealSubscriptionService(
+        seal_api_key,
+        shop_url,
+        rate_limiter=rate_limiter,
+        **options
+    )
+    
+    # Step 1: Export existing data (lazily, chunk_size rows per fetch)
+    existing_subscriptions = export_current_subscriptions(
+        chunk_size,
+        skip_completed=resume,
+        pk_range=pk_range
+    )
+    
+    # Step 2: Transform data chunk by chunk as records are pulled through
+    started = time.monotonic()
+    succeeded = failed = writeback_errors = 0
+    errors: List[Dict[str, str]] = []
+    
+    def on_error(subscription: Dict, error: str) -> None:
+        nonlocal failed
+        failed += 1
+        log_migration_error(subscription, error)
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'customer_id': subscription['customer_id'], 'error': error})
+    
+    seal_formatted_data = iter_seal_format(
+        existing_subscriptions,
+        min(chunk_size, 500),
+        on_error=on_error
+    )
+    seal_formatted_data = journal_submissions(seal_formatted_data, min(chunk_size, 500))
+    
+    # Step 3: Import to Seal, buffering calendar write-backs into batches
+    # (all database work stays on this thread, so one profile sees all of it)
+    with profile_queries('migration', budget=query_budget) as queries:
+        with CalendarReferenceBuffer(writeback_batch_size, writeback_interval) as writeback:
+            for subscription_data, seal_subscription, error in import_subscriptions(
+                seal_service, seal_formatted_data, concurrency, queue_size
+            ):
+                if error is None and not (seal_subscription or {}).get('id'):
+                    error = "Seal response carries no subscription id"
+                if error is None:
+                    succeeded += 1
+                else:
+                    on_error(subscription_data, error)
+                
+                try:
+                    if error is None:
+                        writeback.add(subscription_data['customer_id'], seal_subscription['id'])
+                    else:
+                        writeback.flush_if_due()
+                except DatabaseError as e:
+                    # A failed flush leaves its batch queued for the next one; it
+                    # says nothing about the record that happened to trigger it
+                    writeback_errors += 1
+                    logger.error(f"Calendar write-back failed, {len(writeback)} mappings queued for retry: {str(e)}")
+    
+    stats = report_migration_throughput(succeeded, failed, time.monotonic() - started)
+    stats['errors'] = errors
+    stats['writeback_errors'] = writeback_errors
+    stats['queries'] = queries.count
+    stats['sql_seconds'] = queries.duration
+    return stats
+
+def migrate_in_partitions(
+    seal_api_key: str,
+    shop_url: str,
+    processes: Optional[int] = None,
+    requests_per_second: Optional[float] = None,
+    **options
+) -> Dict[str, Any]:
+    """Run the migration across worker processes, one pk range each
+    
+    Calendars are split into ``processes`` (default: CPU count) ranges of
+    roughly equal size, and each range runs ``migrate_subscription_data`` in
+    its own process with its own database connection and Seal session, so
+    transforms and write-backs scale with cores. ``requests_per_second`` is a
+    global budget divided evenly between partitions. Remaining ``options``
+    are passed to each partition's run and must be picklable.
+    
+    Returns the merged stats, with per-partition stats under ``partitions``
+    and the ranges whose worker crashed under ``failed_partitions``.
+    """
+    processes = processes or os.cpu_count() or 1
+    partitions = plan_partitions(processes, skip_completed=options.get('resume', True))
+    if not partitions:
+        return dict(
+            report_migration_throughput(0, 0, 0.0),
+            errors=[], queries=0, sql_seconds=0.0, partitions=[], failed_partitions=[]
+        )
+    
+    partition_rate = requests_per_second / len(partitions) if requests_per_second else None
+    started = time.monotonic()
+    results: List[Dict[str, Any]] = []
+    failed_partitions: List[Dict[str, Any]] = []
+    
+    # Forked workers must not inherit (and share) the parent's open connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=len(partitions), initializer=_init_partition_worker) as executor:
+        futures = {
+            executor.submit(
+                migrate_subscription_data,
+                seal_api_key,
+                shop_url,
+                requests_per_second=partition_rate,
+                pk_range=pk_range,
+                **options
+            ): pk_range
+            for pk_range in partitions
+        }
+        for future in as_completed(futures):
+            pk_range = futures[future]
+            try:
+                results.append(dict(future.result(), pk_range=pk_range))
+            except Exception as e:
+                logger.error(f"Migration partition {pk_range} failed: {str(e)}")
+                failed_partitions.append({'pk_range': pk_range, 'error': str(e)})
+    
+    stats = report_migration_throughput(
+        sum(result['succeeded'] for result in results),
+        sum(result['failed'] for result in results),
+        time.monotonic() - started
+    )
+    stats['errors'] = [error for result in results for error in result['errors']][:MAX_REPORTED_ERRORS]
+    stats['queries'] = sum(result['queries'] for result in results)
+    stats['sql_seconds'] = sum(result['sql_seconds'] for result in results)
+    stats['partitions'] = sorted(results, key=itemgetter('pk_range'))
+    stats['failed_partitions'] = failed_partitions
+    return stats
+
+def _init_partition_worker() -> None:
+    """Set up Django in a fresh worker; a no-op for forked workers"""
+    import django
+    django.setup()
+
+def plan_partitions(partitions: int, skip_completed: bool = True) -> List[Tuple[int, int]]:
+    """Split the calendars to migrate into balanced ``(start, end)`` pk ranges
+    
+    Boundaries are read at evenly spaced offsets of the pk index, so each
+    range holds about the same number of calendars however sparse the pks
+    are. Ranges are half-open and together cover every calendar to migrate.
+    """
+    pks = _calendars_to_migrate(skip_completed).order_by('pk').values_list('pk', flat=True)
+    total = pks.count()
+    if not total:
+        return []
+    
+    partitions = max(1, min(partitions, total))
+    bounds = [pks[total * index // partitions] for index in range(partitions)]
+    bounds.append(pks.last() + 1)
+    return list(zip(bounds, bounds[1:]))
+
+def import_subscriptions(
+    seal_service: SealSubscriptionService,
+    subscriptions: Iterable[Dict],
+    concurrency: int = 1,
+    queue_size: Optional[int] = None
+) -> Iterator[Tuple[Dict, Optional[Dict], Optional[str]]]:
+    """Create subscriptions in Seal, yielding (data, seal_subscription, error) per record
+    
+    With concurrency > 1 the creates run on a bounded thread pool with at most
+    ``queue_size`` (default ``concurrency * 2``) records in flight. The source
+    is only pulled when a slot frees up, so a slow Seal API applies
+    backpressure all the way to the database cursor. Results are yielded on
+    the calling thread in completion order, so database writes stay off the
+    workers.
+    """
+    if concurrency <= 1:
+        for subscription_data in subscriptions:
+            yield (subscription_data,) + _create_in_seal(seal_service, subscription_data)
+        return
+    
+    max_pending = queue_size or concurrency * 2
+    source = iter(subscriptions)
+    exhausted = False
+    pending = {}
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while pending or not exhausted:
+            # Top up the in-flight window before waiting on results
+            while not exhausted and len(pending) < max_pending:
+                try:
+                    subscription_data = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                future = executor.submit(_create_in_seal, seal_service, subscription_data)
+                pending[future] = subscription_data
             
-            # Update calendar with new Seal subscription ID
-            update_calendar_reference(
-                subscription_data['customer_id'],
-                seal_subscription['id']
-            )
-        except Exception as e:
-            log_migration_error(subscription_data, str(e))
-
-def export_current_subscriptions() -> List[Dict]:
-    """Export existing subscription data"""
-    return SubscriptionCalendar.objects.select_related(
-        'customer'
-    ).prefetch_related(
-        'calendar_items'
-    ).values(
+            if not pending:
+                break
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield (pending.pop(future),) + future.result()
+
+def _create_in_seal(
+    seal_service: SealSubscriptionService,
+    subscription_data: Dict
+) -> Tuple[Optional[Dict], Optional[str]]:
+    """Create a single subscription, returning (seal_subscription, error)"""
+    try:
+        with metrics.timer('migration_phase_seconds', phase='import'):
+            return seal_service.create_subscription(
+                subscription_data,
+                idempotency_key=migration_idempotency_key(subscription_data['customer_id'])
+            ), None
+    except Exception as e:
+        return None, str(e)
+
+def migration_idempotency_key(customer_id: str) -> str:
+    """Stable idempotency key for a customer's migration create"""
+    return f"calendar-migration-{customer_id}"
+
+def report_migration_throughput(succeeded: int, failed: int, elapsed: float) -> Dict[str, Any]:
+    """Log and return throughput statistics for a migration run"""
+    total = succeeded + failed
+    throughput = total / elapsed if elapsed > 0 else 0.0
+    metrics.increment('migration_records_total', succeeded, outcome='succeeded')
+    metrics.increment('migration_records_total', failed, outcome='failed')
+    
+    logger.info(
+        f"Migration processed {total} subscriptions "
+        f"({succeeded} succeeded, {failed} failed) in {elapsed:.1f}s "
+        f"({throughput:.1f} records/s)"
+    )
+    
+    return {
+        'total': total,
+        'succeeded': succeeded,
+        'failed': failed,
+        'elapsed_seconds': elapsed,
+        'records_per_second': throughput,
+    }
+
+def export_current_subscriptions(
+    chunk_size: int = 2000,
+    skip_completed: bool = False,
+    pk_range: Optional[Tuple[int, int]] = None
+) -> Iterator[Dict]:
+    """Export existing subscription data in the shape ``transform_batch`` reads
+    
+    Each row carries the calendar's ``billing_interval`` (named from
+    ``delivery_interval_months``), the date of its latest processed delivery
+    as ``last_billing_date`` (archived deliveries included; None when it has
+    none yet), and the product lines of its next scheduled delivery.
+    Calendar items store no price, so lines are exported with ``price``
+    None and Seal bills the variant's own price.
+    
+    Calendars are streamed with a server-side cursor where the database
+    supports it, fetching ``chunk_size`` rows at a time, and each chunk's
+    product lines are loaded with one more query.
+    """
+    calendars = _calendars_to_migrate(skip_completed)
+    if pk_range is not None:
+        calendars = calendars.filter(pk__gte=pk_range[0], pk__lt=pk_range[1])
+    
+    # Archival only moves settled deliveries, so a hot one is always the latest
+    last_processed = Coalesce(
+        models.Subquery(
+            CalendarItem.objects.filter(
+                calendar_id=models.OuterRef('pk'),
+                status='processed'
+            ).order_by('-delivery_date').values('delivery_date')[:1]
+        ),
+        models.Subquery(
+            ArchivedCalendarItem.objects.filter(
+                calendar_id=models.OuterRef('pk'),
+                status='processed'
+            ).order_by('-delivery_date').values('delivery_date')[:1]
+        )
+    )
+    rows = calendars.order_by('pk').annotate(
+        last_processed=last_processed
+    ).values_list(
+        'pk',
         'customer_id',
-        'subscription_details',
-        'calendar_selections'
+        'delivery_interval_months',
+        'last_processed'
+    ).iterator(chunk_size=chunk_size)
+    
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        
+        products = _next_delivery_products([calendar_id for calendar_id, _, _, _ in chunk])
+        for calendar_id, customer_id, interval_months, last_processed in chunk:
+            yield {
+                'customer_id': customer_id,
+                'billing_interval': _INTERVAL_NAMES.get(interval_months, f"every {interval_months} months"),
+                'last_billing_date': last_processed.isoformat() if last_processed else None,
+                'products': products.get(calendar_id, []),
+            }
+
+def _next_delivery_products(calendar_ids: List[int]) -> Dict[int, List[Dict]]:
+    """Product lines of each calendar's next scheduled delivery, in one query"""
+    today = timezone.now().date()
+    next_delivery = CalendarItem.objects.filter(
+        calendar_id=models.OuterRef('calendar_id'),
+        status='scheduled',
+        delivery_date__gte=today
+    ).order_by('delivery_date').values('delivery_date')[:1]
+    
+    products: Dict[int, List[Dict]] = {}
+    for calendar_id, variant_id, quantity in CalendarItem.objects.filter(
+        calendar_id__in=calendar_ids,
+        status='scheduled',
+        delivery_date=models.Subquery(next_delivery)
+    ).order_by('calendar_id', 'id').values_list('calendar_id', 'product_variant_id', 'quantity'):
+        products.setdefault(calendar_id, []).append({
+            'product_variant_id': variant_id,
+            'quantity': quantity,
+            'price': None
+        })
+    return products
+
+def _calendars_to_migrate(skip_completed: bool):
+    calendars = SubscriptionCalendar.objects.all()
+    if skip_completed:
+        # Anti-join against the journal's unique customer index
+        calendars = calendars.exclude(
+            customer_id__in=MigrationJournal.objects.filter(
+                state='created'
+            ).values('customer_id')
+        )
+    return calendars
+
+def transform_to_seal_format(subscriptions: Iterable[Dict]) -> List[Dict]:
+    """Transform data to match Seal's format
+    
+    Raises ValueError on the first row that can't be transformed.
+    """
+    return list(iter_seal_format(subscriptions))
+
+def iter_seal_format(
+    subscriptions: Iterable[Dict],
+    chunk_size: int = 500,
+    on_error: Optional[Callable[[Dict, str], None]] = None
+) -> Iterator[Dict]:
+    """Lazily transform subscriptions to Seal's format, a chunk at a time
+    
+    Rows that can't be transformed are passed to ``on_error`` and left out
+    of the output; without a handler the first one raises ValueError.
+    """
+    on_error = on_error or _raise_transform_error
+    source = iter(subscriptions)
+    while True:
+        # Pulling a chunk is what drives the export query's cursor
+        with metrics.timer('migration_phase_seconds', phase='export'), \
+                profile_queries('migration.export', budget=PHASE_QUERY_BUDGETS['export']):
+            chunk = list(islice(source, chunk_size))
+        if not chunk:
+            return
+        
+        with metrics.timer('migration_phase_seconds', phase='transform'), \
+                profile_queries('migration.transform', budget=PHASE_QUERY_BUDGETS['transform']):
+            payloads, errors = transform_batch(chunk)
+        for subscription, error in errors:
+            on_error(subscription, error)
+        yield from payloads
+
+def journal_submissions(payloads: Iterable[Dict], batch_size: int = 500) -> Iterator[Dict]:
+    """Mark each batch of payloads as pending in the journal before passing it on
+    
+    A run that is interrupted leaves the records it had in flight as
+    pending, with ``attempts`` counting how often each was submitted.
+    """
+    source = iter(payloads)
+    while True:
+        batch = list(islice(source, batch_size))
+        if not batch:
+            return
+        
+        with profile_queries('migration.journal', budget=PHASE_QUERY_BUDGETS['journal']):
+            mark_migration_pending([payload['customer_id'] for payload in batch])
+        yield from batch
+
+def mark_migration_pending(customer_ids: List[str]) -> None:
+    """Mark customers as pending and count the attempt, in two statements"""
+    MigrationJournal.objects.filter(
+        customer_id__in=customer_ids
+    ).update(
+        state='pending',
+        attempts=models.F('attempts') + 1
+    )
+    # Customers without an entry yet; the ones updated above conflict
+    MigrationJournal.objects.bulk_create(
+        [
+            MigrationJournal(customer_id=customer_id, state='pending', attempts=1)
+            for customer_id in customer_ids
+        ],
+        ignore_conflicts=True
     )
 
-def transform_to_seal_format(subscriptions: List[Dict]) -> List[Dict]:
-    """Transform data to match Seal's format"""
-    transformed_data = []
-    for sub in subscriptions:
-        transformed = {
+def _raise_transform_error(subscription: Dict, error: str) -> None:
+    raise ValueError(f"Cannot transform subscription for customer {subscription.get('customer_id')}: {error}")
+
+def transform_batch(subscriptions: List[Dict]) -> Tuple[List[Dict], List[Tuple[Dict, str]]]:
+    """Transform a chunk of exported rows to Seal's format column by column
+    
+    Each field is computed for the whole chunk in one pass against the
+    module-level lookup tables, and next billing dates are computed once
+    per distinct (last date, interval) pair. Returns ``(payloads, errors)``;
+    a row that can't be transformed lands in ``errors`` with the reason
+    instead of aborting the chunk.
+    """
+    errors: Dict[int, str] = {}
+    
+    # Intervals
+    intervals = [BILLING_INTERVALS.get(sub.get('billing_interval')) for sub in subscriptions]
+    for index, interval in enumerate(intervals):
+        if interval is None:
+            errors[index] = f"Unmapped billing interval: {subscriptions[index].get('billing_interval')!r}"
+    
+    # Next billing dates
+    now = datetime.now()
+    dates: Dict[Tuple[Optional[str], int], str] = {}
+    next_billing_dates: List[Optional[str]] = []
+    for index, (sub, interval) in enumerate(zip(subscriptions, intervals)):
+        if index in errors:
+            next_billing_dates.append(None)
+            continue
+        
+        key = (sub.get('last_billing_date'), interval['interval_count'])
+        if key not in dates:
+            try:
+                last_date = datetime.fromisoformat(key[0].rstrip('Z')) if key[0] else now
+            except (AttributeError, ValueError):
+                errors[index] = f"Invalid last billing date: {key[0]!r}"
+                next_billing_dates.append(None)
+                continue
+            dates[key] = datetime.combine(
+                add_months(last_date.date(), key[1]),
+                last_date.timetz()
+            ).isoformat()
+        next_billing_dates.append(dates[key])
+    
+    # Product lines
+    products: List[Optional[List[Dict]]] = []
+    for index, sub in enumerate(subscriptions):
+        if index in errors:
+            products.append(None)
+            continue
+        try:
+            products.append([
+                dict(zip(_SEAL_PRODUCT_KEYS, _PRODUCT_FIELDS(item)))
+                for item in sub['products']
+            ])
+        except (KeyError, TypeError) as e:
+            errors[index] = f"Invalid product data: missing {e}"
+            products.append(None)
+    
+    payloads = [
+        {
             'customer_id': sub['customer_id'],
-            'billing_interval': map_billing_interval(sub),
-            'products': map_products(sub),
-            'next_billing_date': calculate_next_billing_date(sub),
+            'billing_interval': dict(interval),
+            'products': product_lines,
+            'next_billing_date': next_billing_date,
             # Add other required Seal fields
         }
-        transformed_data.append(transformed)
-    return transformed_data 
+        for index, (sub, interval, product_lines, next_billing_date) in enumerate(
+            zip(subscriptions, intervals, products, next_billing_dates)
+        )
+        if index not in errors
+    ]
+    return payloads, [(subscriptions[index], error) for index, error in sorted(errors.items())]
 
 def map_billing_interval(subscription: Dict) -> Dict:
     """Map existing billing interval to Seal format"""
-    interval_mapping = {
-        'monthly': {'interval': 'month', 'interval_count': 1},
-        'bimonthly': {'interval': 'month', 'interval_count': 2},
-        'quarterly': {'interval': 'month', 'interval_count': 3},
-        # Add other mappings as needed
-    }
-    return interval_mapping.get(subscription['billing_interval'])
+    interval = BILLING_INTERVALS.get(subscription['billing_interval'])
+    return dict(interval) if interval else None
 
 def map_products(subscription: Dict) -> List[Dict]:
     """Map product data to Seal format"""
-    return [{
-        'variant_id': item['product_variant_id'],
-        'quantity': item['quantity'],
-        'price': item['price']  # Ensure price handling matches Seal's requirements
-    } for item in subscription['products']]
+    # Ensure price handling matches Seal's requirements
+    return [
+        dict(zip(_SEAL_PRODUCT_KEYS, _PRODUCT_FIELDS(item)))
+        for item in subscription['products']
+    ]
 
 def calculate_next_billing_date(subscription: Dict) -> str:
     """Calculate next billing date based on current subscription"""
-    from datetime import datetime, timedelta
-    
     # Get the last billing date or use current date if not available
     last_billing_date = subscription.get('last_billing_date')
     if last_billing_date:
@@ -86,7 +579,10 @@ def calculate_next_billing_date(subscription: Dict) -> str:
     
     # Calculate next date based on interval
     if interval['interval'] == 'month':
-        next_date = last_date + timedelta(days=30 * interval['interval_count'])
+        next_date = datetime.combine(
+            add_months(last_date.date(), interval['interval_count']),
+            last_date.timetz()
+        )
     else:
         # Add other interval calculations as needed
         raise ValueError(f"Unsupported interval: {interval['interval']}")
@@ -101,11 +597,103 @@ def update_calendar_reference(customer_id: str, seal_subscription_id: str) -> No
         seal_subscription_id=seal_subscription_id
     )
 
+class CalendarReferenceBuffer:
+    """Collect Seal subscription IDs and write them back to calendars in batches
+    
+    Pairs are flushed with one set-based UPDATE when ``max_size`` pairs are
+    pending or ``max_interval`` seconds have passed since the last flush. Used
+    as a context manager, it performs a final flush on exit, including when
+    the migration is aborted by an error.
+    """
+    
+    def __init__(self, max_size: int = 500, max_interval: float = 5.0):
+        self.max_size = max_size
+        self.max_interval = max_interval
+        self._pending: Dict[str, str] = {}
+        self._last_flush = time.monotonic()
+    
+    def __enter__(self) -> 'CalendarReferenceBuffer':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.flush()
+            return
+        
+        # Don't mask the original error, but never drop completed mappings
+        try:
+            self.flush()
+        except Exception as e:
+            for customer_id, seal_subscription_id in self._pending.items():
+                logger.error(
+                    f"Unsaved Seal subscription {seal_subscription_id} "
+                    f"for customer {customer_id}: {str(e)}"
+                )
+    
+    def __len__(self) -> int:
+        return len(self._pending)
+    
+    def add(self, customer_id: str, seal_subscription_id: str) -> None:
+        """Queue a mapping, flushing if the buffer is full or stale"""
+        self._pending[customer_id] = seal_subscription_id
+        self.flush_if_due()
+    
+    def flush_if_due(self) -> None:
+        """Flush when either the size or the interval trigger has fired"""
+        if not self._pending:
+            return
+        if (len(self._pending) >= self.max_size
+                or time.monotonic() - self._last_flush >= self.max_interval):
+            self.flush()
+    
+    def flush(self) -> int:
+        """Write all pending mappings; they stay queued if the write fails"""
+        flushed = len(self._pending)
+        if flushed:
+            with metrics.timer('migration_phase_seconds', phase='writeback'), \
+                    profile_queries('migration.writeback', budget=PHASE_QUERY_BUDGETS['writeback']):
+                bulk_update_calendar_references(self._pending)
+            self._pending = {}
+        self._last_flush = time.monotonic()
+        return flushed
+
+def bulk_update_calendar_references(references: Dict[str, str]) -> None:
+    """Update many calendars' Seal subscription IDs in one statement
+    
+    The matching journal entries are marked as created in the same
+    transaction, so a mapping is never journaled without being saved, and
+    the customers' calendar summaries are built as they are cut over.
+    """
+    with transaction.atomic():
+        SubscriptionCalendar.objects.filter(
+            customer_id__in=list(references)
+        ).update(
+            seal_subscription_id=models.Case(
+                *[
+                    models.When(customer_id=customer_id, then=models.Value(seal_subscription_id))
+                    for customer_id, seal_subscription_id in references.items()
+                ],
+                output_field=models.CharField()
+            )
+        )
+        MigrationJournal.objects.bulk_create(
+            [
+                MigrationJournal(
+                    customer_id=customer_id,
+                    state='created',
+                    seal_subscription_id=seal_subscription_id,
+                    last_error=''
+                )
+                for customer_id, seal_subscription_id in references.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['customer'],
+            update_fields=['state', 'seal_subscription_id', 'last_error', 'updated_at']
+        )
+        refresh_customer_summaries(references)
+
 def log_migration_error(subscription_data: Dict, error: str) -> None:
     """Log migration errors for later review"""
-    import logging
-    logger = logging.getLogger(__name__)
-    
     error_message = (
         f"Migration failed for customer {subscription_data['customer_id']}: "
         f"{error}"
@@ -114,9 +702,25 @@ def log_migration_error(subscription_data: Dict, error: str) -> None:
     # Log to file
     logger.error(error_message)
     
-    # Could also log to database if needed
-    # MigrationError.objects.create(
-    #     customer_id=subscription_data['customer_id'],
-    #     error_message=error,
-    #     subscription_data=subscription_data
-    # ) 
\ No newline at end of file
+    # Record the failure in the journal so a rerun retries this customer
+    record_migration_failure(subscription_data['customer_id'], error)
+
+def record_migration_failure(customer_id: str, error: str) -> None:
+    """Mark a customer's journal entry as failed
+    
+    Attempts are counted when a record is submitted, so a record that
+    failed before submission (in the transform) is journaled with none.
+    """
+    updated = MigrationJournal.objects.filter(
+        customer_id=customer_id
+    ).update(
+        state='failed',
+        last_error=error
+    )
+    if not updated:
+        MigrationJournal.objects.create(
+            customer_id=customer_id,
+            state='failed',
+            last_error=error,
+            attempts=0
+        )
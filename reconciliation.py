@@ -0,0 +1,226 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from django.core.cache import cache
+from django.db import models, transaction
+from django.utils import timezone
+from requests.exceptions import HTTPError
+from services.seal_integration import SealSubscriptionService, TokenBucket
+from calendar.models import SubscriptionCalendar, CalendarItem
+from calendar.cache import invalidate_calendar_cache
+from calendar.seal_sync import get_subscription_cache
+from calendar.summary import refresh_customer_summaries
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+ETAG_CACHE_TTL = 60 * 60 * 24 * 7  # keep Seal ETags and bodies for a week
+MAX_SAMPLES = 100  # drift examples kept in the report
+
+def reconcile_with_seal(
+    seal_api_key: str,
+    shop_url: str,
+    chunk_size: int = 500,
+    concurrency: int = 8,
+    requests_per_second: Optional[float] = None,
+    repair: bool = False,
+    service_options: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Compare local calendars with Seal and report (optionally repair) drift
+
+    Calendars are streamed in chunks. For each chunk the scheduled items are
+    loaded with one query and Seal state is fetched concurrently, using
+    If-None-Match against the ETag seen on the previous run so unchanged
+    subscriptions cost a 304. Lookups go through the shared subscription
+    cache (settings.SEAL_SUBSCRIPTION_CACHE) when one is configured, so
+    subscriptions fetched recently, and not changed since according to their
+    webhooks, cost no request at all. With ``repair`` set, Seal is treated
+    as the source of truth and each chunk's fixes are applied in one
+    transaction.
+    """
+    rate_limiter = TokenBucket(requests_per_second) if requests_per_second else None
+    options = {
+        'pool_size': max(concurrency, 10),
+        'cache': get_subscription_cache(),
+        **(service_options or {})
+    }
+    seal_service = SealSubscriptionService(seal_api_key, shop_url, rate_limiter=rate_limiter, **options)
+
+    report = {
+        'checked': 0,
+        'in_sync': 0,
+        'not_modified': 0,
+        'repaired': 0,
+        'drift': {},
+        'samples': [],
+    }
+    started = time.monotonic()
+    today = timezone.now().date()
+
+    calendars = SubscriptionCalendar.objects.order_by('pk').values_list(
+        'pk', 'customer_id', 'seal_subscription_id', 'is_active'
+    ).iterator(chunk_size=chunk_size)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for chunk in _chunks(calendars, chunk_size):
+            local = load_local_state([calendar_id for calendar_id, _, _, _ in chunk], today)
+            remote = executor.map(
+                lambda seal_id: fetch_remote_state(seal_service, seal_id) if seal_id else ('missing_seal_id', None, False),
+                [seal_id for _, _, seal_id, _ in chunk]
+            )
+
+            drifted = []
+            for (calendar_id, customer_id, seal_id, active), (fetch_error, state, not_modified) in zip(chunk, remote):
+                report['checked'] += 1
+                report['not_modified'] += not_modified
+                drift = [fetch_error] if fetch_error else diff_calendar(local.get(calendar_id), state, active)
+                if not drift:
+                    report['in_sync'] += 1
+                    continue
+
+                for kind in drift:
+                    report['drift'][kind] = report['drift'].get(kind, 0) + 1
+                if len(report['samples']) < MAX_SAMPLES:
+                    report['samples'].append({'calendar_id': calendar_id, 'seal_subscription_id': seal_id, 'drift': drift})
+                if not fetch_error:
+                    drifted.append((calendar_id, customer_id, local.get(calendar_id), state, drift))
+
+            if repair and drifted:
+                report['repaired'] += repair_drift(drifted, today)
+
+    report['elapsed_seconds'] = time.monotonic() - started
+    logger.info(
+        f"Reconciled {report['checked']} calendars in {report['elapsed_seconds']:.1f}s: "
+        f"{report['in_sync']} in sync, drift {report['drift']}, {report['repaired']} repaired"
+    )
+    return report
+
+def _chunks(rows: Iterator, size: int) -> Iterator[List]:
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+def load_local_state(calendar_ids: List[int], today) -> Dict[int, Dict[str, Any]]:
+    """Next scheduled delivery and its product lines for each calendar"""
+    state: Dict[int, Dict[str, Any]] = {}
+    for item in CalendarItem.objects.filter(
+        calendar_id__in=calendar_ids,
+        status='scheduled',
+        delivery_date__gte=today
+    ).order_by('calendar_id', 'delivery_date').values_list(
+        'calendar_id', 'delivery_date', 'product_variant_id', 'quantity'
+    ):
+        calendar_id, delivery_date, variant_id, quantity = item
+        calendar_state = state.setdefault(calendar_id, {'next_delivery_date': delivery_date, 'products': {}})
+        if delivery_date == calendar_state['next_delivery_date']:
+            calendar_state['products'][variant_id] = quantity
+    return state
+
+def fetch_remote_state(
+    seal_service: SealSubscriptionService,
+    seal_subscription_id: str
+) -> Tuple[Optional[str], Optional[Dict], bool]:
+    """Fetch Seal's view of a subscription as ``(error_kind, state, not_modified)``"""
+    cache_key = f"seal:etag:{seal_subscription_id}"
+    cached = cache.get(cache_key)
+    try:
+        subscription, etag = seal_service.get_subscription_if_changed(
+            seal_subscription_id,
+            cached[0] if cached else None
+        )
+    except HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return 'not_found', None, False
+        return 'fetch_failed', None, False
+    except Exception:
+        return 'fetch_failed', None, False
+
+    if subscription is None:
+        return None, cached[1], True
+    if etag:
+        cache.set(cache_key, (etag, subscription), timeout=ETAG_CACHE_TTL)
+    return None, subscription, False
+
+def diff_calendar(local: Optional[Dict[str, Any]], remote: Dict[str, Any], active: bool = True) -> List[str]:
+    """Kinds of drift between a calendar's local state and Seal's"""
+    if remote.get('status') == 'cancelled':
+        return ['cancelled_in_seal'] if local or active else []
+    if local is None:
+        return ['no_scheduled_items']
+
+    drift = []
+    remote_date = remote.get('next_delivery_date') or remote.get('next_billing_date')
+    if remote_date and remote_date[:10] != local['next_delivery_date'].isoformat():
+        drift.append('next_delivery_mismatch')
+
+    remote_products = {
+        product['variant_id']: product.get('quantity')
+        for product in remote.get('products') or []
+    }
+    if remote_products and remote_products != local['products']:
+        drift.append('products_mismatch')
+    return drift
+
+def repair_drift(drifted: List[Tuple], today) -> int:
+    """Apply Seal's state to drifted calendars with one statement per kind of fix"""
+    cancelled, date_fixes, quantity_fixes = [], {}, {}
+    for calendar_id, _, local, remote, drift in drifted:
+        if 'cancelled_in_seal' in drift:
+            cancelled.append(calendar_id)
+            continue
+        if 'next_delivery_mismatch' in drift:
+            remote_date = (remote.get('next_delivery_date') or remote.get('next_billing_date'))[:10]
+            date_fixes[calendar_id] = (local['next_delivery_date'], remote_date)
+        if 'products_mismatch' in drift:
+            for product in remote.get('products') or []:
+                # Only existing lines are adjusted; added or removed variants are reported
+                if product['variant_id'] in local['products'] and product.get('quantity') is not None:
+                    quantity_fixes[(calendar_id, product['variant_id'])] = (local['next_delivery_date'], product['quantity'])
+
+    with transaction.atomic():
+        if cancelled:
+            SubscriptionCalendar.objects.filter(pk__in=cancelled).update(is_active=False)
+            CalendarItem.objects.filter(
+                calendar_id__in=cancelled,
+                delivery_date__gte=today,
+                status='scheduled'
+            ).update(status='cancelled')
+
+        # Quantities first: they match on the local date, which the date fix moves
+        if quantity_fixes:
+            match = models.Q()
+            for (calendar_id, variant_id), (delivery_date, _) in quantity_fixes.items():
+                match |= models.Q(calendar_id=calendar_id, product_variant_id=variant_id, delivery_date=delivery_date)
+            CalendarItem.objects.filter(match, status='scheduled').update(
+                quantity=models.Case(
+                    *[
+                        models.When(calendar_id=calendar_id, product_variant_id=variant_id, then=models.Value(quantity))
+                        for (calendar_id, variant_id), (_, quantity) in quantity_fixes.items()
+                    ],
+                    default=models.F('quantity'),
+                    output_field=models.PositiveIntegerField()
+                )
+            )
+
+        if date_fixes:
+            match = models.Q()
+            for calendar_id, (local_date, _) in date_fixes.items():
+                match |= models.Q(calendar_id=calendar_id, delivery_date=local_date)
+            CalendarItem.objects.filter(match, status='scheduled').update(
+                delivery_date=models.Case(
+                    *[
+                        models.When(calendar_id=calendar_id, then=models.Value(remote_date))
+                        for calendar_id, (_, remote_date) in date_fixes.items()
+                    ],
+                    output_field=models.DateField()
+                )
+            )
+
+        refresh_customer_summaries((customer_id for _, customer_id, _, _, _ in drifted), today)
+        for customer_id in {customer_id for _, customer_id, _, _, _ in drifted}:
+            invalidate_calendar_cache(customer_id)
+
+    return len(set(cancelled) | set(date_fixes) | {calendar_id for calendar_id, _ in quantity_fixes})
@@ -0,0 +1,119 @@
+"""In-process counters, gauges and histograms rendered as Prometheus text
+
+Recording is off unless enabled with ``set_enabled(True)`` or the
+``METRICS_ENABLED`` environment variable; while disabled, every recording
+call returns after a single flag check.
+"""
+from typing import Dict, Iterator, Optional, Tuple
+from contextlib import contextmanager, nullcontext
+import os
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple], float] = {}
+_gauges: Dict[Tuple[str, Tuple], float] = {}
+_histograms: Dict[Tuple[str, Tuple], list] = {}  # [bucket counts..., sum, count]
+_NULL_TIMER = nullcontext()
+
+def is_enabled() -> bool:
+    return _enabled
+
+def set_enabled(enabled: bool) -> None:
+    global _enabled
+    _enabled = enabled
+
+def reset() -> None:
+    """Drop every recorded series"""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+def _key(name: str, labels: Dict[str, object]) -> Tuple[str, Tuple]:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+def increment(name: str, amount: float = 1.0, **labels) -> None:
+    """Add to a counter"""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + amount
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """Set a gauge to an absolute value"""
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record one observation in a histogram"""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [0] * len(DEFAULT_BUCKETS) + [0.0, 0]
+        for index, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+def timer(name: str, **labels):
+    """Context manager observing the elapsed seconds of its block"""
+    if not _enabled:
+        return _NULL_TIMER
+    return _timer(name, labels)
+
+@contextmanager
+def _timer(name: str, labels: Dict[str, object]) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+def render_prometheus() -> str:
+    """Render every series in the Prometheus text exposition format"""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {key: list(series) for key, series in _histograms.items()}
+
+    lines = []
+    for kind, series in (('counter', counters), ('gauge', gauges)):
+        for name in sorted({name for name, _ in series}):
+            lines.append(f"# TYPE {name} {kind}")
+            for (series_name, labels), value in sorted(series.items()):
+                if series_name == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (series_name, labels), series in sorted(histograms.items()):
+            if series_name != name:
+                continue
+            for bound, count in zip(DEFAULT_BUCKETS, series):
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', str(bound)))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {series[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {series[-2]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {series[-1]}")
+
+    return '\n'.join(lines) + '\n' if lines else ''
+
+def _format_labels(labels: Tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (
+        f'{label}="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for label, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
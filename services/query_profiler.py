@@ -0,0 +1,106 @@
+"""Per-scope SQL query profiling
+
+``profile_queries`` counts the queries run on a connection inside a block,
+along with their total time and any statement shape that ran more than
+once (the signature of an N+1). ``QueryProfilerMiddleware`` wraps every
+request in it; the migration profiles each of its phases.
+
+    with profile_queries('migration.writeback', budget=5) as profile:
+        buffer.flush()
+"""
+from typing import Dict, Iterator, Optional
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from services import metrics
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_BUDGET = 50  # queries per request before a warning is logged
+_PLACEHOLDER_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+class QueryProfile:
+    """Queries observed in one profiled scope"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.duration = 0.0
+        self._statements: Counter = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper; shapes are normalized lazily
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self._statements[sql] += 1
+
+    def duplicates(self) -> Dict[str, int]:
+        """Statement shapes that ran more than once, with their counts"""
+        shapes: Counter = Counter()
+        for sql, count in self._statements.items():
+            shapes[normalize_sql(sql)] += count
+        return {shape: count for shape, count in shapes.most_common() if count > 1}
+
+    def summary(self) -> str:
+        duplicates = self.duplicates()
+        lines = [f"{self.label}: {self.count} queries in {self.duration * 1000:.1f}ms"]
+        lines += [f"  {count}x {shape}" for shape, count in list(duplicates.items())[:5]]
+        return '\n'.join(lines)
+
+def normalize_sql(sql: str) -> str:
+    """Reduce a statement to its shape: literals and IN-list lengths removed"""
+    return _LITERAL.sub('?', _PLACEHOLDER_LIST.sub('(%s, ...)', sql))
+
+@contextmanager
+def profile_queries(
+    label: str,
+    budget: Optional[int] = None,
+    using: str = DEFAULT_DB_ALIAS
+) -> Iterator[QueryProfile]:
+    """Profile the queries the current thread runs on ``using`` inside the block
+
+    When more than ``budget`` queries ran, a warning with the most
+    duplicated statement shapes is logged.
+    """
+    profile = QueryProfile(label)
+    try:
+        with connections[using].execute_wrapper(profile):
+            yield profile
+    finally:
+        # Scopes that raise are recorded too; their queries still ran
+        metrics.increment('db_queries_total', profile.count, scope=profile.label)
+        metrics.observe('db_query_seconds', profile.duration, scope=profile.label)
+        if budget is not None and profile.count > budget:
+            metrics.increment('db_query_budget_exceeded_total', scope=profile.label)
+            logger.warning(f"Query budget of {budget} exceeded by {profile.summary()}")
+
+class QueryProfilerMiddleware:
+    """Profile each request's queries against settings.QUERY_BUDGET
+
+    Enabled with settings.QUERY_PROFILER. Scopes are labelled with the
+    resolved view name rather than the path, to keep metric labels bounded.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_PROFILER', False)
+        self.budget = getattr(settings, 'QUERY_BUDGET', DEFAULT_QUERY_BUDGET)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        with profile_queries('request', budget=self.budget) as profile:
+            response = self.get_response(request)
+            match = getattr(request, 'resolver_match', None)
+            profile.label = match.view_name if match else 'unresolved'
+        return response
@@ -1,45 +1,420 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple, Union
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import requests
-from requests.exceptions import RequestException
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException, ConnectionError, Timeout
+from services import metrics
+import random
+import re
+import threading
 import time
 
+# Responses worth retrying; any other 4xx is a request problem and fails immediately
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+_ID_SEGMENT = re.compile(r'(/subscriptions/)[^/]+')
+
+class SealUnavailableError(RequestException):
+    """Raised without calling Seal while the circuit breaker is open"""
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter for Seal's API quota"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate  # tokens added per second
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block until the requested number of tokens is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+class CircuitBreaker:
+    """Fail fast after repeated Seal outages instead of stalling every caller
+    
+    The circuit opens after ``failure_threshold`` consecutive failures. Once
+    ``reset_timeout`` seconds have passed, a single probe request is let
+    through; its outcome closes the circuit or re-opens it. A probe that
+    ends without a verdict (throttled, or a client error) must be released
+    with ``release_probe`` so the next caller can probe again.
+    """
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._probe_owner: Optional[int] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+    
+    def allow_request(self) -> bool:
+        """Return whether a request may be sent to Seal right now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing:
+                return False
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._probing = True
+                self._probe_owner = threading.get_ident()
+                return True
+            return False
+    
+    def release_probe(self) -> None:
+        """Let another probe through if this thread's probe recorded no outcome"""
+        with self._lock:
+            if self._probing and self._probe_owner == threading.get_ident():
+                self._probing = False
+    
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+    
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+class SubscriptionCache:
+    """Bounded, thread-safe LRU cache with a TTL for Seal subscription lookups
+    
+    Each entry holds the subscription and the ETag Seal sent with it, so
+    conditional fetches can be answered from the cache as well.
+    """
+    
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, subscription_id: str) -> Optional[Dict[str, Any]]:
+        entry = self.get_entry(subscription_id)
+        return entry[0] if entry is not None else None
+    
+    def get_entry(self, subscription_id: str) -> Optional[Tuple[Dict[str, Any], Optional[str]]]:
+        """Return ``(subscription, etag)`` for a live entry"""
+        with self._lock:
+            entry = self._entries.get(subscription_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[subscription_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subscription_id)
+            self.hits += 1
+            return entry[1], entry[2]
+    
+    def set(self, subscription_id: str, subscription: Dict[str, Any], etag: Optional[str] = None) -> None:
+        with self._lock:
+            self._entries[subscription_id] = (time.monotonic() + self.ttl, subscription, etag)
+            self._entries.move_to_end(subscription_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, subscription_id: str) -> None:
+        with self._lock:
+            self._entries.pop(subscription_id, None)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'size': len(self._entries),
+        }
+
+class DjangoSubscriptionCache(SubscriptionCache):
+    """Subscription cache stored in Django's cache framework
+    
+    Entries live in the configured cache backend, so an invalidation from
+    the process handling a webhook reaches every other process too. Keys
+    carry a generation number that ``clear`` bumps, which retires every
+    entry without having to find them. ``size`` isn't known and is not
+    reported.
+    """
+    
+    def __init__(self, ttl: float = 300.0, alias: str = 'default', prefix: str = 'seal:subscription:'):
+        from django.core.cache import caches
+        super().__init__(ttl=ttl)
+        self.backend = caches[alias]
+        self.prefix = prefix
+    
+    def _key(self, subscription_id: str) -> str:
+        generation_key = f"{self.prefix}generation"
+        generation = self.backend.get(generation_key)
+        if generation is None:
+            # Seed from the clock so an evicted generation never revives old keys
+            self.backend.add(generation_key, int(time.time() * 1000), timeout=None)
+            generation = self.backend.get(generation_key)
+        return f"{self.prefix}{generation}:{subscription_id}"
+    
+    def get_entry(self, subscription_id: str) -> Optional[Tuple[Dict[str, Any], Optional[str]]]:
+        entry = self.backend.get(self._key(subscription_id))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+    
+    def set(self, subscription_id: str, subscription: Dict[str, Any], etag: Optional[str] = None) -> None:
+        self.backend.set(self._key(subscription_id), (subscription, etag), timeout=self.ttl)
+    
+    def invalidate(self, subscription_id: str) -> None:
+        self.backend.delete(self._key(subscription_id))
+    
+    def clear(self) -> None:
+        try:
+            self.backend.incr(f"{self.prefix}generation")
+        except ValueError:
+            # No generation yet, so nothing was cached under one either
+            pass
+    
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.pop('size')
+        return stats
+
 class SealSubscriptionService:
-    def __init__(self, api_key: str, shop_url: str):
+    def __init__(
+        self,
+        api_key: str,
+        shop_url: str,
+        rate_limiter: Optional[TokenBucket] = None,
+        pool_size: int = 10,
+        timeout: Union[float, Tuple[float, float]] = (3.05, 30),
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        base_url: Optional[str] = None,
+        cache: Optional[SubscriptionCache] = None
+    ):
         self.api_key = api_key
-        self.base_url = f"https://{shop_url}/apps/seal/api/v1"
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout  # (connect, read) seconds
+        self.max_retries = max(1, max_retries)  # attempts, including the first
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.cache = cache  # optional read-through cache for get_subscription
+        # base_url overrides the shop's API root, e.g. to target a local stand-in
+        self.base_url = base_url or f"https://{shop_url}/apps/seal/api/v1"
         self.session = requests.Session()
         self.session.headers.update({
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         })
+        
+        # Size the connection pool for the number of threads sharing the session
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
     
-    def create_subscription(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Create a new subscription in Seal"""
-        return self._make_request('POST', '/subscriptions', json=data)
+    def create_subscription(self, data: Dict[str, Any], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """Create a new subscription in Seal
+        
+        Retried or replayed creates that send the same idempotency key
+        return the original subscription instead of creating a duplicate.
+        """
+        headers = {'Idempotency-Key': idempotency_key} if idempotency_key else None
+        return self._make_request('POST', '/subscriptions', json=data, headers=headers)
     
     def get_subscription(self, subscription_id: str) -> Dict[str, Any]:
-        """Fetch subscription details from Seal"""
-        return self._make_request('GET', f'/subscriptions/{subscription_id}')
+        """Fetch subscription details from Seal
+        
+        With a cache configured, lookups are served from it until the entry
+        expires or is invalidated. Treat the returned dict as read-only.
+        """
+        if self.cache is not None:
+            entry = self.cache.get_entry(subscription_id)
+            if entry is not None:
+                return entry[0]
+        
+        response = self._send('GET', f'/subscriptions/{subscription_id}')
+        subscription = response.json()
+        if self.cache is not None:
+            self.cache.set(subscription_id, subscription, response.headers.get('ETag'))
+        return subscription
+    
+    def invalidate_subscription(self, subscription_id: str) -> None:
+        """Drop a cached subscription, e.g. after Seal reports a change"""
+        if self.cache is not None:
+            self.cache.invalidate(subscription_id)
+    
+    def get_subscription_if_changed(
+        self,
+        subscription_id: str,
+        etag: Optional[str] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Conditionally fetch a subscription using If-None-Match
+        
+        Returns ``(subscription, etag)``; ``subscription`` is None when Seal
+        answers 304 Not Modified for the given ETag. With a cache
+        configured, a live entry answers without a request: unchanged when
+        its ETag matches, otherwise the cached subscription.
+        """
+        if self.cache is not None:
+            entry = self.cache.get_entry(subscription_id)
+            if entry is not None and (etag is None or entry[1] is not None):
+                subscription, cached_etag = entry
+                return (None, etag) if etag and cached_etag == etag else (subscription, cached_etag)
+        
+        headers = {'If-None-Match': etag} if etag else None
+        response = self._send('GET', f'/subscriptions/{subscription_id}', headers=headers)
+        if response.status_code == 304:
+            return None, etag
+        subscription, etag = response.json(), response.headers.get('ETag')
+        if self.cache is not None:
+            self.cache.set(subscription_id, subscription, etag)
+        return subscription, etag
     
     def update_subscription(self, subscription_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """Update subscription in Seal based on calendar changes"""
-        return self._make_request('PATCH', f'/subscriptions/{subscription_id}', json=data)
+        try:
+            return self._make_request('PATCH', f'/subscriptions/{subscription_id}', json=data)
+        finally:
+            self.invalidate_subscription(subscription_id)
     
     def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
         """Handle API requests with retry logic and error handling"""
-        max_retries = 3
-        retry_delay = 1  # seconds
+        return self._send(method, endpoint, **kwargs).json()
+    
+    def _send(self, method: str, endpoint: str, **kwargs) -> requests.Response:
+        """Send a request with retries, returning the successful response
         
-        for attempt in range(max_retries):
-            try:
-                response = self.session.request(
-                    method,
-                    f"{self.base_url}{endpoint}",
-                    **kwargs
+        Connection errors, timeouts, 429s and 5xx responses are retried with
+        exponential backoff and full jitter, honouring ``Retry-After`` when
+        Seal sends one. Other 4xx responses are raised immediately.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        # Collapse IDs so metrics get one series per endpoint, not per subscription
+        route = _ID_SEGMENT.sub(r'\1{id}', endpoint) if metrics.is_enabled() else endpoint
+        
+        for attempt in range(self.max_retries):
+            is_last_attempt = attempt == self.max_retries - 1
+            
+            if not self.circuit_breaker.allow_request():
+                metrics.increment('seal_circuit_rejections_total', method=method, endpoint=route)
+                raise SealUnavailableError(
+                    f"Seal API circuit is open, not sending {method} {endpoint}"
                 )
-                response.raise_for_status()
-                return response.json()
-            except RequestException as e:
-                if attempt == max_retries - 1:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            
+            try:
+                response = self._attempt(method, endpoint, route, kwargs)
+            except (ConnectionError, Timeout) as e:
+                if is_last_attempt:
                     raise
-                time.sleep(retry_delay * (attempt + 1)) 
\ No newline at end of file
+                self._sleep_before_retry(method, route, type(e).__name__, self._backoff_delay(attempt))
+                continue
+            finally:
+                # A probe that ended without success or failure must not hold the circuit
+                self.circuit_breaker.release_probe()
+            
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                if is_last_attempt:
+                    response.raise_for_status()
+                retry_after = self._retry_after(response)
+                self._sleep_before_retry(
+                    method, route, response.status_code,
+                    min(retry_after, self.backoff_max) if retry_after is not None
+                    else self._backoff_delay(attempt)
+                )
+                continue
+            
+            response.raise_for_status()
+            return response
+    
+    def _attempt(self, method: str, endpoint: str, route: str, kwargs: Dict[str, Any]) -> requests.Response:
+        """Send one request and record its outcome with the circuit breaker"""
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method,
+                f"{self.base_url}{endpoint}",
+                **kwargs
+            )
+        except (ConnectionError, Timeout) as e:
+            metrics.observe(
+                'seal_request_seconds', time.perf_counter() - started,
+                method=method, endpoint=route, status=type(e).__name__
+            )
+            self.circuit_breaker.record_failure()
+            raise
+        
+        metrics.observe(
+            'seal_request_seconds', time.perf_counter() - started,
+            method=method, endpoint=route, status=response.status_code
+        )
+        # Throttling means Seal is up, so only server errors trip the breaker
+        if response.status_code >= 500:
+            self.circuit_breaker.record_failure()
+        elif response.status_code != 429:
+            self.circuit_breaker.record_success()
+        return response
+    
+    @staticmethod
+    def _sleep_before_retry(method: str, route: str, reason: Any, delay: float) -> None:
+        metrics.increment('seal_retries_total', method=method, endpoint=route, reason=reason)
+        metrics.increment('seal_retry_sleep_seconds_total', delay, method=method, endpoint=route)
+        time.sleep(delay)
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    @staticmethod
+    def _retry_after(response: requests.Response) -> Optional[float]:
+        """Parse a Retry-After header given as seconds or an HTTP date"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
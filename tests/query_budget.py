@@ -0,0 +1,15 @@
+from contextlib import contextmanager
+from django.db import DEFAULT_DB_ALIAS
+from services.query_profiler import profile_queries
+
+class QueryBudgetMixin:
+    """TestCase mixin asserting how many queries a block may run"""
+
+    @contextmanager
+    def assertQueryBudget(self, budget, allow_duplicates=True, using=DEFAULT_DB_ALIAS):
+        with profile_queries('test', using=using) as profile:
+            yield profile
+        if profile.count > budget:
+            self.fail(f"Query budget of {budget} exceeded.\n{profile.summary()}")
+        if not allow_duplicates and profile.duplicates():
+            self.fail(f"Duplicated queries.\n{profile.summary()}")
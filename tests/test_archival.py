@@ -0,0 +1,59 @@
+from django.test import TestCase
+from django.utils import timezone
+from calendar.models import SubscriptionCalendar, CalendarItem, ArchivedCalendarItem
+from calendar.archival import archive_calendar_items, calendar_history
+from datetime import timedelta
+
+class ArchivalTests(TestCase):
+    def setUp(self):
+        self.customer_id = "cust_123"
+        self.calendar = SubscriptionCalendar.objects.create(
+            customer_id=self.customer_id,
+            seal_subscription_id="seal_sub_123"
+        )
+        today = timezone.now().date()
+        self.old_items = [
+            CalendarItem.objects.create(
+                calendar=self.calendar,
+                delivery_date=today - timedelta(days=400 + i),
+                product_variant_id="variant_1",
+                status=status
+            )
+            for i, status in enumerate(['processed', 'skipped', 'cancelled'])
+        ]
+        self.recent = CalendarItem.objects.create(
+            calendar=self.calendar,
+            delivery_date=today - timedelta(days=10),
+            product_variant_id="variant_1",
+            status='processed'
+        )
+        self.scheduled = CalendarItem.objects.create(
+            calendar=self.calendar,
+            delivery_date=today + timedelta(days=10),
+            product_variant_id="variant_1",
+            status='scheduled'
+        )
+
+    def test_archive_moves_settled_items_in_batches(self):
+        archived = archive_calendar_items(cutoff_days=180, batch_size=2, pause=0)
+        
+        self.assertEqual(archived, 3)
+        self.assertEqual(
+            set(CalendarItem.objects.values_list('id', flat=True)),
+            {self.recent.id, self.scheduled.id}
+        )
+        self.assertEqual(
+            set(ArchivedCalendarItem.objects.values_list('original_id', flat=True)),
+            {item.id for item in self.old_items}
+        )
+
+    def test_history_includes_archived_items_on_request(self):
+        archive_calendar_items(cutoff_days=180, pause=0)
+        
+        self.assertEqual([row['id'] for row in calendar_history(self.customer_id)], [self.recent.id])
+        history = calendar_history(self.customer_id, include_archived=True)
+        self.assertEqual(
+            [row['id'] for row in history],
+            [self.recent.id] + [item.id for item in self.old_items]
+        )
+        self.assertTrue(all(row['archived'] for row in history[1:]))
@@ -1,16 +1,23 @@
+from django.db import DatabaseError
 from django.test import TestCase
 from django.utils import timezone
 from unittest.mock import patch, MagicMock
 from migration_plan import (
+    CalendarReferenceBuffer,
+    bulk_update_calendar_references,
+    export_current_subscriptions,
     migrate_subscription_data,
+    plan_partitions,
+    transform_batch,
     transform_to_seal_format,
     map_billing_interval,
     map_products
 )
-from calendar.models import SubscriptionCalendar, CalendarItem
-from datetime import datetime, timedelta
+from query_budget import QueryBudgetMixin
+from calendar.models import SubscriptionCalendar, CalendarItem, MigrationJournal
+from datetime import date, datetime, timedelta
 
-class MigrationTests(TestCase):
+class MigrationTests(QueryBudgetMixin, TestCase):
     def setUp(self):
         # Create test customer
         self.customer_id = "cust_123"
@@ -41,6 +48,28 @@ class MigrationTests(TestCase):
             'customer_id': self.customer_id
         }
 
+    def test_export_rows_match_the_transform(self):
+        self.calendar.delivery_interval_months = 3
+        self.calendar.save()
+        CalendarItem.objects.create(
+            calendar=self.calendar,
+            delivery_date=date(2024, 1, 31),
+            product_variant_id="variant_0",
+            status='processed'
+        )
+        
+        rows = list(export_current_subscriptions())
+        
+        self.assertEqual(rows, [{
+            'customer_id': self.customer_id,
+            'billing_interval': 'quarterly',
+            'last_billing_date': '2024-01-31',
+            'products': [{'product_variant_id': 'variant_0', 'quantity': 1, 'price': None}]
+        }])
+        payloads, errors = transform_batch(rows)
+        self.assertEqual(errors, [])
+        self.assertEqual(payloads[0]['next_billing_date'], '2024-04-30T00:00:00')
+
     @patch('services.seal_integration.SealSubscriptionService')
     def test_migration_success(self, mock_seal_service):
         # Configure mock
@@ -57,6 +86,23 @@ class MigrationTests(TestCase):
         # Verify Seal service was called correctly
         mock_instance.create_subscription.assert_called_once()
         
+    @patch('migration_plan.SealSubscriptionService')
+    def test_concurrent_migration(self, mock_seal_service):
+        mock_instance = mock_seal_service.return_value
+        mock_instance.create_subscription.return_value = self.mock_seal_response
+        
+        stats = migrate_subscription_data(
+            'fake_api_key',
+            'fake_shop_url',
+            concurrency=4,
+            requests_per_second=100
+        )
+        
+        updated_calendar = SubscriptionCalendar.objects.get(id=self.calendar.id)
+        self.assertEqual(updated_calendar.seal_subscription_id, 'seal_sub_123')
+        self.assertEqual(stats['succeeded'], 1)
+        self.assertEqual(stats['failed'], 0)
+        
     def test_transform_to_seal_format(self):
         test_subscription = {
             'customer_id': self.customer_id,
@@ -78,6 +124,12 @@ class MigrationTests(TestCase):
             {'interval': 'month', 'interval_count': 1}
         )
         
+    def test_transform_to_seal_format_raises_without_side_effects(self):
+        with self.assertRaises(ValueError):
+            transform_to_seal_format([{'customer_id': self.customer_id, 'billing_interval': 'fortnightly'}])
+        
+        self.assertFalse(MigrationJournal.objects.exists())
+
     @patch('services.seal_integration.SealSubscriptionService')
     def test_migration_error_handling(self, mock_seal_service):
         # Configure mock to raise exception
@@ -120,4 +172,156 @@ class MigrationTests(TestCase):
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0]['variant_id'], 'var_1')
         self.assertEqual(result[0]['quantity'], 2)
-        self.assertEqual(result[0]['price'], 1999)
\ No newline at end of file
+        self.assertEqual(result[0]['price'], 1999)
+
+    def test_calendar_reference_buffer_flushes_on_size(self):
+        buffer = CalendarReferenceBuffer(max_size=2, max_interval=3600)
+        
+        buffer.add(self.customer_id, 'seal_sub_123')
+        self.assertEqual(len(buffer), 1)
+        self.assertEqual(
+            SubscriptionCalendar.objects.get(id=self.calendar.id).seal_subscription_id,
+            ""
+        )
+        
+        buffer.add('cust_456', 'seal_sub_456')
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(
+            SubscriptionCalendar.objects.get(id=self.calendar.id).seal_subscription_id,
+            'seal_sub_123'
+        )
+
+    def test_calendar_reference_buffer_flushes_on_exit(self):
+        with self.assertRaises(RuntimeError):
+            with CalendarReferenceBuffer(max_size=100, max_interval=3600) as buffer:
+                buffer.add(self.customer_id, 'seal_sub_123')
+                raise RuntimeError("import aborted")
+        
+        updated_calendar = SubscriptionCalendar.objects.get(id=self.calendar.id)
+        self.assertEqual(updated_calendar.seal_subscription_id, 'seal_sub_123')
+
+    @patch('migration_plan.SealSubscriptionService')
+    def test_migration_journal_and_resume(self, mock_seal_service):
+        mock_instance = mock_seal_service.return_value
+        mock_instance.create_subscription.return_value = self.mock_seal_response
+        
+        migrate_subscription_data('fake_api_key', 'fake_shop_url')
+        
+        journal = MigrationJournal.objects.get(customer_id=self.customer_id)
+        self.assertEqual(journal.state, 'created')
+        self.assertEqual(journal.seal_subscription_id, 'seal_sub_123')
+        _, kwargs = mock_instance.create_subscription.call_args
+        self.assertEqual(kwargs['idempotency_key'], f"calendar-migration-{self.customer_id}")
+        
+        # A rerun skips customers that were already created
+        stats = migrate_subscription_data('fake_api_key', 'fake_shop_url')
+        self.assertEqual(stats['total'], 0)
+        mock_instance.create_subscription.assert_called_once()
+
+    @patch('migration_plan.SealSubscriptionService')
+    def test_journal_counts_submitted_attempts(self, mock_seal_service):
+        mock_instance = mock_seal_service.return_value
+        mock_instance.create_subscription.side_effect = Exception("Seal unavailable")
+        
+        migrate_subscription_data('fake_api_key', 'fake_shop_url')
+        migrate_subscription_data('fake_api_key', 'fake_shop_url')
+        
+        journal = MigrationJournal.objects.get(customer_id=self.customer_id)
+        self.assertEqual(journal.state, 'failed')
+        self.assertEqual(journal.attempts, 2)
+        self.assertIn('Seal unavailable', journal.last_error)
+
+    @patch('migration_plan.SealSubscriptionService')
+    def test_interrupted_run_leaves_submitted_records_pending(self, mock_seal_service):
+        mock_instance = mock_seal_service.return_value
+        mock_instance.create_subscription.side_effect = KeyboardInterrupt
+        
+        with self.assertRaises(KeyboardInterrupt):
+            migrate_subscription_data('fake_api_key', 'fake_shop_url')
+        
+        journal = MigrationJournal.objects.get(customer_id=self.customer_id)
+        self.assertEqual(journal.state, 'pending')
+        self.assertEqual(journal.attempts, 1)
+
+    @patch('migration_plan.SealSubscriptionService')
+    def test_failed_writeback_flush_is_retried_not_counted_as_failure(self, mock_seal_service):
+        mock_instance = mock_seal_service.return_value
+        mock_instance.create_subscription.return_value = self.mock_seal_response
+        flushes = []
+        
+        def flaky_update(references):
+            flushes.append(dict(references))
+            if len(flushes) == 1:
+                raise DatabaseError("connection lost")
+            bulk_update_calendar_references(references)
+        
+        with patch('migration_plan.bulk_update_calendar_references', side_effect=flaky_update):
+            stats = migrate_subscription_data('fake_api_key', 'fake_shop_url', writeback_batch_size=1)
+        
+        self.assertEqual((stats['succeeded'], stats['failed'], stats['writeback_errors']), (1, 0, 1))
+        self.assertEqual(flushes, [{self.customer_id: 'seal_sub_123'}] * 2)
+        self.assertEqual(MigrationJournal.objects.get(customer_id=self.customer_id).state, 'created')
+
+    def test_transform_batch_reports_bad_rows_without_aborting(self):
+        rows = [
+            {
+                'customer_id': self.customer_id,
+                'billing_interval': 'quarterly',
+                'last_billing_date': '2024-01-31T10:00:00Z',
+                'products': [{'product_variant_id': 'var_1', 'quantity': 1, 'price': 1999}]
+            },
+            {
+                'customer_id': 'cust_456',
+                'billing_interval': 'fortnightly',
+                'products': []
+            },
+        ]
+        
+        payloads, errors = transform_batch(rows)
+        
+        self.assertEqual(len(payloads), 1)
+        self.assertEqual(payloads[0]['next_billing_date'], '2024-04-30T10:00:00')
+        self.assertEqual(payloads[0]['products'][0]['variant_id'], 'var_1')
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0][0]['customer_id'], 'cust_456')
+        self.assertIn('fortnightly', errors[0][1])
+
+    @patch('migration_plan.SealSubscriptionService')
+    def test_partitions_cover_every_calendar_once(self, mock_seal_service):
+        mock_instance = mock_seal_service.return_value
+        mock_instance.create_subscription.return_value = self.mock_seal_response
+        for index in range(4):
+            SubscriptionCalendar.objects.create(customer_id=f"cust_{index}", seal_subscription_id="")
+        
+        partitions = plan_partitions(2)
+        
+        self.assertEqual(len(partitions), 2)
+        self.assertEqual(partitions[0][1], partitions[1][0])
+        totals = [
+            migrate_subscription_data('fake_api_key', 'fake_shop_url', pk_range=pk_range)['total']
+            for pk_range in partitions
+        ]
+        self.assertEqual(totals, [2, 3])
+
+    @patch('migration_plan.SealSubscriptionService')
+    def test_migration_query_budget_does_not_grow_per_record(self, mock_seal_service):
+        mock_instance = mock_seal_service.return_value
+        mock_instance.create_subscription.side_effect = lambda data, **kwargs: {
+            'id': f"seal_{data['customer_id']}"
+        }
+        for index in range(10):
+            SubscriptionCalendar.objects.create(customer_id=f"cust_{index}", seal_subscription_id="")
+        
+        # One export chunk, one pending mark and a single write-back batch
+        with self.assertQueryBudget(11):
+            stats = migrate_subscription_data('fake_api_key', 'fake_shop_url')
+        
+        self.assertEqual(stats['succeeded'], 11)
+
+    @patch.dict('migration_plan.PHASE_QUERY_BUDGETS', {'writeback': 0})
+    def test_phase_over_query_budget_is_logged(self):
+        with self.assertLogs('services.query_profiler', level='WARNING') as log:
+            with CalendarReferenceBuffer(max_size=100, max_interval=3600) as buffer:
+                buffer.add(self.customer_id, 'seal_sub_123')
+        
+        self.assertIn('migration.writeback', log.output[0])
@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from unittest.mock import patch
+from calendar.models import SubscriptionCalendar, CalendarItem
+from reconciliation import reconcile_with_seal
+from datetime import timedelta
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.next_date = timezone.now().date() + timedelta(days=5)
+        self.calendar = SubscriptionCalendar.objects.create(
+            customer_id="cust_123",
+            seal_subscription_id="seal_sub_123"
+        )
+        self.item = CalendarItem.objects.create(
+            calendar=self.calendar,
+            delivery_date=self.next_date,
+            product_variant_id="variant_1",
+            quantity=1,
+            status='scheduled'
+        )
+        self.remote = {
+            'id': 'seal_sub_123',
+            'status': 'active',
+            'next_delivery_date': (self.next_date + timedelta(days=2)).isoformat(),
+            'products': [{'variant_id': 'variant_1', 'quantity': 3}]
+        }
+
+    @patch('reconciliation.SealSubscriptionService')
+    def test_reports_drift_without_repairing(self, mock_seal_service):
+        mock_instance = mock_seal_service.return_value
+        mock_instance.get_subscription_if_changed.return_value = (self.remote, '"v1"')
+        
+        report = reconcile_with_seal('fake_api_key', 'fake_shop_url')
+        
+        self.assertEqual(report['checked'], 1)
+        self.assertEqual(report['drift'], {'next_delivery_mismatch': 1, 'products_mismatch': 1})
+        self.assertEqual(CalendarItem.objects.get(id=self.item.id).quantity, 1)
+
+    @patch('reconciliation.SealSubscriptionService')
+    def test_repair_applies_seal_state_and_uses_etags(self, mock_seal_service):
+        mock_instance = mock_seal_service.return_value
+        mock_instance.get_subscription_if_changed.return_value = (self.remote, '"v1"')
+        
+        report = reconcile_with_seal('fake_api_key', 'fake_shop_url', repair=True)
+        
+        item = CalendarItem.objects.get(id=self.item.id)
+        self.assertEqual(report['repaired'], 1)
+        self.assertEqual(item.quantity, 3)
+        self.assertEqual(item.delivery_date, self.next_date + timedelta(days=2))
+        
+        # The next run sends the stored ETag and diffs against the cached body
+        mock_instance.get_subscription_if_changed.return_value = (None, '"v1"')
+        report = reconcile_with_seal('fake_api_key', 'fake_shop_url')
+        
+        mock_instance.get_subscription_if_changed.assert_called_with('seal_sub_123', '"v1"')
+        self.assertEqual(report['not_modified'], 1)
+        self.assertEqual(report['in_sync'], 1)
+
+    @patch('reconciliation.SealSubscriptionService')
+    def test_repair_deactivates_calendars_cancelled_in_seal(self, mock_seal_service):
+        mock_instance = mock_seal_service.return_value
+        mock_instance.get_subscription_if_changed.return_value = ({'id': 'seal_sub_123', 'status': 'cancelled'}, '"v1"')
+        self.item.delivery_date = self.next_date - timedelta(days=30)
+        self.item.status = 'processed'
+        self.item.save()
+        
+        report = reconcile_with_seal('fake_api_key', 'fake_shop_url', repair=True)
+        
+        self.assertEqual(report['drift'], {'cancelled_in_seal': 1})
+        self.assertFalse(SubscriptionCalendar.objects.get(id=self.calendar.id).is_active)
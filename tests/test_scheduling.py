@@ -0,0 +1,95 @@
+from django.test import TestCase
+from calendar.models import SubscriptionCalendar, CalendarItem, ArchivedCalendarItem
+from calendar.scheduling import add_months, materialize_delivery_horizon, project_delivery_dates
+from calendar.views import apply_subscription_cancellation
+from datetime import date
+
+class SchedulingTests(TestCase):
+    def test_add_months_clamps_to_month_end(self):
+        self.assertEqual(add_months(date(2024, 1, 31), 1), date(2024, 2, 29))
+        self.assertEqual(add_months(date(2023, 1, 31), 1), date(2023, 2, 28))
+        self.assertEqual(add_months(date(2024, 11, 15), 3), date(2025, 2, 15))
+        self.assertEqual(add_months(date(2024, 2, 29), 1, anchor_day=31), date(2024, 3, 31))
+
+    def test_project_delivery_dates_skips_past_steps(self):
+        schedules = project_delivery_dates(
+            [date(2024, 1, 31), date(2023, 5, 15)],
+            [31, 15],
+            [1, 3],
+            [3, 2],
+            today=date(2024, 2, 10)
+        )
+        
+        self.assertEqual(schedules, [
+            [date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)],
+            [date(2024, 2, 15), date(2024, 5, 15)],
+        ])
+
+    def test_materialize_delivery_horizon(self):
+        calendar = SubscriptionCalendar.objects.create(
+            customer_id="cust_123",
+            seal_subscription_id="seal_sub_123",
+            delivery_interval_months=1
+        )
+        for variant in ['variant_1', 'variant_2']:
+            CalendarItem.objects.create(
+                calendar=calendar,
+                delivery_date=date(2024, 1, 31),
+                product_variant_id=variant,
+                quantity=2,
+                status='scheduled'
+            )
+        
+        created = materialize_delivery_horizon(horizon=3, today=date(2024, 1, 20))
+        
+        self.assertEqual(created, 4)
+        self.assertEqual(
+            sorted(set(calendar.calendar_items.values_list('delivery_date', flat=True))),
+            [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31)]
+        )
+        self.assertEqual(materialize_delivery_horizon(horizon=3, today=date(2024, 1, 20)), 0)
+
+    def test_materialize_keeps_anchor_after_archival(self):
+        calendar = SubscriptionCalendar.objects.create(
+            customer_id="cust_123",
+            seal_subscription_id="seal_sub_123",
+            delivery_interval_months=1
+        )
+        ArchivedCalendarItem.objects.create(
+            original_id=1000,
+            calendar=calendar,
+            delivery_date=date(2024, 1, 31),
+            product_variant_id='variant_1',
+            status='processed'
+        )
+        CalendarItem.objects.create(
+            calendar=calendar,
+            delivery_date=date(2024, 2, 29),
+            product_variant_id='variant_1',
+            status='scheduled'
+        )
+        
+        materialize_delivery_horizon(horizon=2, today=date(2024, 2, 20))
+        
+        self.assertEqual(calendar.calendar_items.order_by('delivery_date').last().delivery_date, date(2024, 3, 31))
+        calendar.refresh_from_db()
+        self.assertEqual(calendar.delivery_anchor_day, 31)
+
+    def test_materialize_skips_calendars_cancelled_after_their_last_delivery(self):
+        calendar = SubscriptionCalendar.objects.create(
+            customer_id="cust_123",
+            seal_subscription_id="seal_sub_123",
+            delivery_interval_months=1
+        )
+        CalendarItem.objects.create(
+            calendar=calendar,
+            delivery_date=date(2024, 1, 31),
+            product_variant_id='variant_1',
+            status='processed'
+        )
+        
+        # Nothing upcoming is left to cancel, but the calendar is deactivated
+        apply_subscription_cancellation({'subscription_id': 'seal_sub_123'})
+        
+        self.assertEqual(materialize_delivery_horizon(horizon=3, today=date(2024, 3, 1)), 0)
+        self.assertEqual(calendar.calendar_items.count(), 1)
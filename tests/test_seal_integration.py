@@ -0,0 +1,199 @@
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+from django.test import SimpleTestCase, override_settings
+from requests.exceptions import HTTPError
+from calendar import seal_sync
+from services import metrics
+from services.seal_integration import (
+    SealSubscriptionService,
+    SealUnavailableError,
+    CircuitBreaker,
+    SubscriptionCache
+)
+import threading
+
+def make_response(status_code, json_data=None, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.json.return_value = json_data or {}
+    if status_code >= 400:
+        response.raise_for_status.side_effect = HTTPError(f"{status_code} error")
+    return response
+
+class SealTransportTests(TestCase):
+    def setUp(self):
+        self.service = SealSubscriptionService('fake_api_key', 'fake_shop_url')
+        self.service.session = MagicMock()
+
+    @patch('services.seal_integration.time.sleep')
+    def test_client_errors_are_not_retried(self, mock_sleep):
+        self.service.session.request.return_value = make_response(422)
+        
+        with self.assertRaises(HTTPError):
+            self.service.get_subscription('seal_sub_123')
+        
+        self.assertEqual(self.service.session.request.call_count, 1)
+        mock_sleep.assert_not_called()
+
+    @patch('services.seal_integration.time.sleep')
+    def test_rate_limited_requests_honour_retry_after(self, mock_sleep):
+        self.service.session.request.side_effect = [
+            make_response(429, headers={'Retry-After': '7'}),
+            make_response(200, {'id': 'seal_sub_123'})
+        ]
+        
+        result = self.service.get_subscription('seal_sub_123')
+        
+        self.assertEqual(result, {'id': 'seal_sub_123'})
+        mock_sleep.assert_called_once_with(7.0)
+
+    @patch('services.seal_integration.time.sleep')
+    def test_circuit_breaker_fails_fast_during_outage(self, mock_sleep):
+        self.service.circuit_breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        self.service.session.request.return_value = make_response(503)
+        
+        with self.assertRaises(HTTPError):
+            self.service.get_subscription('seal_sub_123')
+        with self.assertRaises(SealUnavailableError):
+            self.service.get_subscription('seal_sub_123')
+        
+        self.assertEqual(self.service.session.request.call_count, 3)
+
+    @patch('services.seal_integration.time.monotonic')
+    @patch('services.seal_integration.time.sleep')
+    def test_throttled_probe_does_not_wedge_the_circuit(self, mock_sleep, mock_monotonic):
+        mock_monotonic.return_value = 0.0
+        self.service.circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        self.service.max_retries = 1
+        self.service.session.request.side_effect = [
+            make_response(503),
+            make_response(429, headers={'Retry-After': '3600'}),
+            make_response(200, {'id': 'seal_sub_123'})
+        ]
+        
+        with self.assertRaises(HTTPError):
+            self.service.get_subscription('seal_sub_123')
+        mock_monotonic.return_value = 61.0
+        with self.assertRaises(HTTPError):
+            self.service.get_subscription('seal_sub_123')
+        
+        self.assertEqual(self.service.get_subscription('seal_sub_123'), {'id': 'seal_sub_123'})
+        self.assertFalse(self.service.circuit_breaker.is_open)
+
+    @patch('services.seal_integration.time.sleep')
+    def test_retry_after_is_capped_at_backoff_max(self, mock_sleep):
+        self.service.session.request.side_effect = [
+            make_response(429, headers={'Retry-After': '3600'}),
+            make_response(200, {'id': 'seal_sub_123'})
+        ]
+        
+        self.service.get_subscription('seal_sub_123')
+        
+        mock_sleep.assert_called_once_with(self.service.backoff_max)
+
+    @patch('services.seal_integration.time.sleep')
+    def test_requests_are_instrumented_per_endpoint(self, mock_sleep):
+        metrics.reset()
+        metrics.set_enabled(True)
+        self.addCleanup(metrics.set_enabled, False)
+        self.service.session.request.side_effect = [
+            make_response(429, headers={'Retry-After': '2'}),
+            make_response(200, {'id': 'seal_sub_123'})
+        ]
+        
+        self.service.get_subscription('seal_sub_123')
+        
+        output = metrics.render_prometheus()
+        self.assertIn(
+            'seal_retries_total{endpoint="/subscriptions/{id}",method="GET",reason="429"} 1.0',
+            output
+        )
+        self.assertIn(
+            'seal_request_seconds_count{endpoint="/subscriptions/{id}",method="GET",status="200"} 1',
+            output
+        )
+        self.assertNotIn('seal_sub_123', output)
+
+
+class SubscriptionCacheTests(TestCase):
+    def setUp(self):
+        self.service = SealSubscriptionService(
+            'fake_api_key',
+            'fake_shop_url',
+            cache=SubscriptionCache(max_size=2, ttl=60)
+        )
+        self.service.session = MagicMock()
+        self.service.session.request.side_effect = lambda method, url, **kwargs: make_response(
+            200, {'id': url.rsplit('/', 1)[-1]}
+        )
+
+    def test_repeated_lookups_are_served_from_cache(self):
+        self.service.get_subscription('seal_sub_1')
+        result = self.service.get_subscription('seal_sub_1')
+        
+        self.assertEqual(result, {'id': 'seal_sub_1'})
+        self.assertEqual(self.service.session.request.call_count, 1)
+        self.assertEqual(self.service.cache.stats()['hit_ratio'], 0.5)
+
+    def test_update_and_invalidation_drop_the_entry(self):
+        self.service.get_subscription('seal_sub_1')
+        self.service.update_subscription('seal_sub_1', {'quantity': 2})
+        self.service.get_subscription('seal_sub_1')
+        self.service.invalidate_subscription('seal_sub_1')
+        self.service.get_subscription('seal_sub_1')
+        
+        self.assertEqual(self.service.session.request.call_count, 4)
+
+    def test_conditional_fetch_is_answered_from_cache(self):
+        self.service.session.request.side_effect = [
+            make_response(200, {'id': 'seal_sub_1'}, headers={'ETag': '"v1"'})
+        ]
+        
+        self.assertEqual(
+            self.service.get_subscription_if_changed('seal_sub_1'),
+            ({'id': 'seal_sub_1'}, '"v1"')
+        )
+        self.assertEqual(self.service.get_subscription_if_changed('seal_sub_1', '"v1"'), (None, '"v1"'))
+        self.assertEqual(self.service.get_subscription('seal_sub_1'), {'id': 'seal_sub_1'})
+        self.assertEqual(self.service.session.request.call_count, 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for subscription_id in ('seal_sub_1', 'seal_sub_2', 'seal_sub_1', 'seal_sub_3'):
+            self.service.get_subscription(subscription_id)
+        
+        self.assertIsNotNone(self.service.cache.get('seal_sub_1'))
+        self.assertIsNone(self.service.cache.get('seal_sub_2'))
+
+@override_settings(SEAL_API_KEY='fake_api_key', SHOP_URL='fake_shop_url')
+class SealServiceFactoryTests(SimpleTestCase):
+    def setUp(self):
+        for name in ('_seal_service', '_subscription_cache'):
+            patcher = patch.object(seal_sync, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_seal_service(self):
+        # Run on a thread so a deadlock fails the test instead of hanging the run
+        result = {}
+        thread = threading.Thread(
+            target=lambda: result.update(service=seal_sync.get_seal_service()),
+            daemon=True
+        )
+        thread.start()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive(), "get_seal_service() deadlocked")
+        return result['service']
+
+    def test_service_without_cache(self):
+        service = self.get_seal_service()
+        
+        self.assertIsNone(service.cache)
+        self.assertIs(seal_sync.get_seal_service(), service)
+
+    @override_settings(SEAL_SUBSCRIPTION_CACHE='local')
+    def test_service_with_cache(self):
+        service = self.get_seal_service()
+        
+        self.assertIsInstance(service.cache, SubscriptionCache)
+        self.assertIs(service.cache, seal_sync.get_subscription_cache())
@@ -0,0 +1,207 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, RequestFactory, override_settings
+from unittest.mock import patch
+from django.utils import timezone
+from query_budget import QueryBudgetMixin
+from calendar.models import SubscriptionCalendar, CalendarItem, SealSyncOutbox
+from calendar.seal_sync import dispatch_seal_syncs
+from calendar.cache import calendar_cache_stats
+from calendar.views import (
+    batch_update_calendar_items,
+    calendar_items_view,
+    calendar_summary_view,
+    calendar_view,
+    handle_subscription_cancellation,
+    handle_subscription_update,
+    update_calendars_products
+)
+from datetime import timedelta
+import json
+
+class CalendarViewTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.customer_id = "cust_123"
+        self.calendar = SubscriptionCalendar.objects.create(
+            customer_id=self.customer_id,
+            seal_subscription_id="seal_sub_123"
+        )
+        
+        start_date = timezone.now().date() + timedelta(days=1)
+        self.items = [
+            CalendarItem.objects.create(
+                calendar=self.calendar,
+                delivery_date=start_date + timedelta(days=30 * (i // 2)),
+                product_variant_id=f"variant_{i}",
+                quantity=1,
+                status='scheduled'
+            )
+            for i in range(5)
+        ]
+
+    def get_json(self, view, path, *args, **params):
+        response = view(self.factory.get(path, params), *args)
+        return response.status_code, json.loads(response.content)
+
+    def post_json(self, view, path, payload, *args):
+        request = self.factory.post(path, data=json.dumps(payload), content_type='application/json')
+        response = view(request, *args)
+        return response.status_code, json.loads(response.content)
+
+    def test_calendar_items_cursor_pagination(self):
+        seen = []
+        params = {'limit': 2}
+        while True:
+            status, data = self.get_json(
+                calendar_items_view, '/calendar/items/', self.customer_id, **params
+            )
+            self.assertEqual(status, 200)
+            seen += [item['id'] for item in data['items']]
+            if not data['pagination']['has_next']:
+                break
+            params['cursor'] = data['pagination']['next_cursor']
+        
+        self.assertEqual(seen, [item.id for item in self.items])
+
+    def test_calendar_items_rejects_invalid_cursor(self):
+        status, _ = self.get_json(
+            calendar_items_view, '/calendar/items/', self.customer_id, cursor='not-a-cursor'
+        )
+        self.assertEqual(status, 400)
+
+    def test_calendar_view_cache_is_invalidated_by_webhooks(self):
+        _, first = self.get_json(calendar_view, '/calendar/', self.customer_id)
+        hits = calendar_cache_stats()['hits']
+        _, cached = self.get_json(calendar_view, '/calendar/', self.customer_id)
+        
+        self.assertEqual(first, cached)
+        self.assertEqual(calendar_cache_stats()['hits'], hits + 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            handle_subscription_cancellation({'subscription_id': 'seal_sub_123'})
+        _, refreshed = self.get_json(calendar_view, '/calendar/', self.customer_id)
+        
+        self.assertEqual(len(first['items']), 5)
+        self.assertEqual(refreshed['items'], [])
+
+    @patch('calendar.views.sync_calendar_with_seal')
+    def test_batch_update_applies_all_items_with_one_sync(self, mock_sync):
+        status, data = self.post_json(batch_update_calendar_items, '/calendar/items/batch/', {
+            'items': [
+                {'id': item.id, 'status': 'skipped', 'quantity': 2}
+                for item in self.items[:3]
+            ],
+            'sync_with_seal': True
+        })
+        
+        self.assertEqual(status, 200)
+        self.assertEqual(data['updated'], 3)
+        self.assertEqual(
+            list(CalendarItem.objects.filter(status='skipped', quantity=2).order_by('id')),
+            self.items[:3]
+        )
+        mock_sync.assert_called_once()
+
+    def test_batch_update_rejects_invalid_items(self):
+        status, data = self.post_json(batch_update_calendar_items, '/calendar/items/batch/', {
+            'items': [
+                {'id': self.items[0].id, 'status': 'skipped'},
+                {'id': self.items[1].id, 'quantity': 0}
+            ]
+        })
+        
+        self.assertEqual(status, 400)
+        self.assertIn(str(self.items[1].id), data['errors'])
+        self.assertEqual(CalendarItem.objects.filter(status='skipped').count(), 0)
+
+    @override_settings(SEAL_SYNC_OUTBOX=True)
+    @patch('calendar.seal_sync.get_seal_service')
+    @patch('calendar.views.sync_calendar_with_seal')
+    def test_outbox_coalesces_syncs_per_subscription(self, mock_sync, mock_get_service):
+        for item in self.items[:2]:
+            self.post_json(batch_update_calendar_items, '/calendar/items/batch/', {
+                'items': [{'id': item.id, 'quantity': 3}],
+                'sync_with_seal': True
+            })
+        
+        mock_sync.assert_not_called()
+        self.assertEqual(SealSyncOutbox.objects.filter(status='pending').count(), 2)
+        
+        stats = dispatch_seal_syncs(concurrency=1)
+        
+        update_subscription = mock_get_service.return_value.update_subscription
+        update_subscription.assert_called_once()
+        subscription_id, update_data = update_subscription.call_args[0]
+        self.assertEqual(subscription_id, 'seal_sub_123')
+        self.assertEqual(len(update_data['products']), 2)
+        self.assertEqual(stats['sent'], 2)
+
+    def test_update_calendars_products_in_one_statement(self):
+        other_calendar = SubscriptionCalendar.objects.create(
+            customer_id="cust_456",
+            seal_subscription_id="seal_sub_456"
+        )
+        other_item = CalendarItem.objects.create(
+            calendar=other_calendar,
+            delivery_date=self.items[0].delivery_date,
+            product_variant_id="variant_0",
+            quantity=1,
+            status='scheduled'
+        )
+        
+        with CaptureQueriesContext(connection) as queries:
+            updated = update_calendars_products([self.calendar, other_calendar], [
+                {'variant_id': 'variant_0', 'quantity': 5},
+                {'variant_id': 'variant_1', 'status': 'skipped'},
+                {'variant_id': 'variant_1', 'quantity': 9},
+            ])
+        
+        self.assertEqual(updated, 3)
+        self.assertEqual(
+            len([query for query in queries if query['sql'].startswith('UPDATE')]),
+            1
+        )
+        self.assertEqual(CalendarItem.objects.get(id=other_item.id).quantity, 5)
+        self.assertEqual(CalendarItem.objects.get(id=self.items[0].id).quantity, 5)
+        skipped = CalendarItem.objects.get(id=self.items[1].id)
+        self.assertEqual((skipped.status, skipped.quantity), ('skipped', 1))
+
+    def test_calendar_summary_tracks_write_paths(self):
+        status, data = self.get_json(calendar_summary_view, '/calendar/summary/', self.customer_id)
+        
+        self.assertEqual(status, 200)
+        self.assertEqual(data['next_delivery_date'], self.items[0].delivery_date.isoformat())
+        self.assertEqual(data['scheduled_count'], 5)
+        self.assertEqual([len(delivery['items']) for delivery in data['upcoming_deliveries']], [2, 2, 1])
+        
+        handle_subscription_cancellation({'subscription_id': 'seal_sub_123'})
+        with self.assertNumQueries(1):
+            status, data = self.get_json(calendar_summary_view, '/calendar/summary/', self.customer_id)
+        
+        self.assertIsNone(data['next_delivery_date'])
+        self.assertEqual(data['scheduled_count'], 0)
+
+    def test_calendar_view_query_budget(self):
+        # Count, calendar page and one prefetch of its items; never one per item
+        with self.assertQueryBudget(3, allow_duplicates=False):
+            status, data = self.get_json(calendar_view, '/calendar/', self.customer_id)
+        
+        self.assertEqual(status, 200)
+        self.assertEqual(len(data['items']), 5)
+
+    def test_calendar_summary_follows_date_move_with_empty_product_changes(self):
+        self.get_json(calendar_summary_view, '/calendar/summary/', self.customer_id)
+        new_date = self.items[0].delivery_date + timedelta(days=7)
+        
+        handle_subscription_update({
+            'subscription_id': 'seal_sub_123',
+            'next_delivery_date': new_date.isoformat(),
+            'product_changes': []
+        })
+        status, data = self.get_json(calendar_summary_view, '/calendar/summary/', self.customer_id)
+        
+        self.assertEqual(data['next_delivery_date'], new_date.isoformat())
+        self.assertEqual(len(data['upcoming_deliveries']), 1)
@@ -0,0 +1,142 @@
+from django.test import TransactionTestCase, RequestFactory, override_settings
+from django.utils import timezone
+from unittest.mock import patch
+from query_budget import QueryBudgetMixin
+from calendar.models import SubscriptionCalendar, CalendarItem, WebhookEvent
+from calendar.views import webhook_handler
+from calendar.webhook_queue import drain_webhook_queue, coalesce_webhook_events
+from datetime import timedelta
+import json
+
+class WebhookQueueTests(QueryBudgetMixin, TransactionTestCase):
+    # Worker threads use their own connections, so data must be committed
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.calendar = SubscriptionCalendar.objects.create(
+            customer_id="cust_123",
+            seal_subscription_id="seal_sub_123"
+        )
+        self.item = CalendarItem.objects.create(
+            calendar=self.calendar,
+            delivery_date=timezone.now().date() + timedelta(days=10),
+            product_variant_id="variant_1",
+            quantity=1,
+            status='scheduled'
+        )
+
+    def post_webhook(self, payload):
+        request = self.factory.post(
+            '/webhooks/seal/',
+            data=json.dumps(payload),
+            content_type='application/json'
+        )
+        return webhook_handler(request)
+
+    @override_settings(SEAL_WEBHOOK_QUEUE=True)
+    def test_queued_webhook_is_applied_by_worker(self):
+        response = self.post_webhook({
+            'event_type': 'subscription.cancelled',
+            'subscription_id': 'seal_sub_123'
+        })
+        
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(CalendarItem.objects.get(id=self.item.id).status, 'scheduled')
+        
+        stats = drain_webhook_queue(concurrency=2)
+        
+        self.assertEqual(stats['processed'], 1)
+        self.assertEqual(CalendarItem.objects.get(id=self.item.id).status, 'cancelled')
+        self.assertEqual(WebhookEvent.objects.get().status, 'processed')
+
+    @override_settings(SEAL_WEBHOOK_QUEUE=True)
+    def test_failing_webhook_is_dead_lettered(self):
+        self.post_webhook({
+            'event_type': 'subscription.updated',
+            'subscription_id': 'seal_sub_unknown'
+        })
+        
+        with patch('calendar.leases.RETRY_DELAY', 0):
+            stats = drain_webhook_queue(concurrency=1, max_attempts=2)
+        
+        event = WebhookEvent.objects.get()
+        self.assertEqual(stats['dead'], 1)
+        self.assertEqual(event.status, 'dead')
+        self.assertEqual(event.attempts, 2)
+
+    @override_settings(SEAL_WEBHOOK_QUEUE=True)
+    def test_redelivered_webhook_is_ignored(self):
+        payload = {
+            'event_id': 'evt_1',
+            'event_type': 'subscription.cancelled',
+            'subscription_id': 'seal_sub_123'
+        }
+        
+        self.assertEqual(self.post_webhook(payload).status_code, 202)
+        self.assertEqual(self.post_webhook(payload).status_code, 200)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+    @override_settings(SEAL_WEBHOOK_QUEUE=True)
+    def test_updates_for_one_subscription_are_coalesced(self):
+        for i, quantity in enumerate([2, 3, 4]):
+            self.post_webhook({
+                'event_id': f'evt_{i}',
+                'event_type': 'subscription.updated',
+                'subscription_id': 'seal_sub_123',
+                'timestamp': f'2024-01-01T00:00:0{i}Z',
+                'product_changes': [{'variant_id': 'variant_1', 'quantity': quantity}]
+            })
+        
+        with patch('calendar.views.update_calendar_products') as mock_update:
+            stats = drain_webhook_queue()
+        
+        self.assertEqual(stats['processed'], 3)
+        mock_update.assert_called_once()
+        self.assertEqual(mock_update.call_args[0][1], [{'variant_id': 'variant_1', 'quantity': 4}])
+
+    @override_settings(SEAL_WEBHOOK_QUEUE=True)
+    def test_newer_events_wait_for_an_older_retry(self):
+        for i, date in enumerate(['2024-02-01', '2024-03-01']):
+            self.post_webhook({
+                'event_id': f'evt_{i}',
+                'event_type': 'subscription.updated',
+                'subscription_id': 'seal_sub_123',
+                'next_delivery_date': date
+            })
+        # The older event failed and is waiting out its backoff
+        WebhookEvent.objects.filter(event_id='evt_0').update(
+            attempts=1,
+            available_at=timezone.now() + timedelta(minutes=5)
+        )
+        
+        stats = drain_webhook_queue()
+        
+        self.assertEqual(stats['processed'], 0)
+        self.assertEqual(WebhookEvent.objects.get(event_id='evt_1').status, 'pending')
+
+    def test_coalesce_keeps_cancellations_as_barriers(self):
+        merged = coalesce_webhook_events([
+            {'event_type': 'subscription.updated', 'next_delivery_date': '2024-02-01'},
+            {'event_type': 'subscription.updated', 'next_delivery_date': '2024-03-01'},
+            {'event_type': 'subscription.cancelled'},
+            {'event_type': 'subscription.cancelled'},
+            {'event_type': 'subscription.updated', 'next_delivery_date': '2024-04-01'},
+        ])
+        
+        self.assertEqual([event['event_type'] for event in merged], [
+            'subscription.updated',
+            'subscription.cancelled',
+            'subscription.updated',
+        ])
+        self.assertEqual(merged[0]['next_delivery_date'], '2024-03-01')
+
+    def test_webhook_handler_query_budget(self):
+        # Calendar lookup, one product UPDATE, the summary refresh and transaction statements
+        with self.assertQueryBudget(8, allow_duplicates=False):
+            response = self.post_webhook({
+                'event_type': 'subscription.updated',
+                'subscription_id': 'seal_sub_123',
+                'product_changes': [{'variant_id': 'variant_1', 'quantity': 3}]
+            })
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(CalendarItem.objects.get(id=self.item.id).quantity, 3)